@@ -333,4 +333,15 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_CACHE_URL', default='redis://127.0.0.1:6379/1'),
+    },
+}
+
+# Seconds over which live score updates for a competition are merged into a
+# single websocket message. 0 sends every update as soon as it commits.
+LIVE_SCORE_COALESCE_WINDOW = config('LIVE_SCORE_COALESCE_WINDOW', default=0.15, cast=float)
+
 OPENAI_API_KEY = config("OPENAI_API_KEY")
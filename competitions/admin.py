@@ -2,20 +2,48 @@ import csv
 from datetime import date, timedelta
 
 from django.contrib import admin
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.urls import path
 
 from .forms import ExportNationalsForm
+from .live import touch_run_order
+from .run_order import sync_run_order_lanes
 from .utils import get_local_qualifiers, get_regional_qualifiers, get_pro_am_qualifiers, create_or_update_qualifier
 from rest_framework.authtoken.models import Token
 from accounts.models import AthleteProfile
 from .models import (
     Competition, Event, AthleteCompetition, EventImplement,
     Tag, Federation, Sponsor, Result, ZipCode, EventBase, Division, WeightClass, TshirtSize, AthleteEventNote,
-    LaneAssignment, CompetitionRunOrder, CompetitionStaff, NationalsQualifier
+    LaneAssignment, CompetitionRunOrder, CompetitionStaff, NationalsQualifier, Attempt
 )
 
+
+class RunOrderBoardAdminMixin:
+    """
+    For models shown on the judge console: once an admin edit commits, the
+    run-order boards of the events it touched move to a new version.
+    """
+
+    def touch_boards(self, event_ids):
+        event_ids = set(event_ids)
+        transaction.on_commit(lambda: touch_run_order(event_ids))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.touch_boards([obj.event_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.touch_boards([obj.event_id])
+
+    def delete_queryset(self, request, queryset):
+        event_ids = set(queryset.values_list('event_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.touch_boards(event_ids)
+
+
 class CompetitionRunOrderInline(admin.TabularInline):
     model = CompetitionRunOrder
     extra = 0
@@ -214,6 +242,8 @@ class EventAdmin(admin.ModelAdmin):
 
         # Save any many-to-many fields
         formset.save_m2m()
+        if formset.model is CompetitionRunOrder:
+            transaction.on_commit(lambda: touch_run_order([event.pk]))
 
 
 @admin.register(AthleteCompetition)
@@ -221,6 +251,20 @@ class AthleteCompetitionAdmin(admin.ModelAdmin):
     list_display = ('athlete', 'competition', 'division', 'weight_class', 'payment_status', 'signed_up')
     list_filter = ('competition', 'division', 'weight_class', 'payment_status', 'signed_up')
 
+    # A removed registration drops off every run-order board of its competition.
+    def touch_competition_boards(self, competition_ids):
+        event_ids = list(Event.objects.filter(competition__in=competition_ids).values_list('pk', flat=True))
+        transaction.on_commit(lambda: touch_run_order(event_ids))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.touch_competition_boards([obj.competition_id])
+
+    def delete_queryset(self, request, queryset):
+        competition_ids = set(queryset.values_list('competition_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.touch_competition_boards(competition_ids)
+
 
 @admin.register(EventImplement)
 class EventImplementAdmin(admin.ModelAdmin):
@@ -229,10 +273,11 @@ class EventImplementAdmin(admin.ModelAdmin):
 
 
 @admin.register(Result)
-class ResultAdmin(admin.ModelAdmin):
+class ResultAdmin(RunOrderBoardAdminMixin, admin.ModelAdmin):
     list_display = ('athlete_competition', 'event', 'points_earned', 'event_rank', 'value')
     search_fields = ('athlete_competition__athlete__user__username', 'event__name')
     list_filter = ('event__competition', 'event')
+    readonly_fields = Result.PARSED_FIELDS
 
 @admin.register(ZipCode)
 class ZipCodeAdmin(admin.ModelAdmin):
@@ -263,7 +308,7 @@ class TshirtSizeAdmin(admin.ModelAdmin):
     ordering = ('size',)
 
 @admin.register(AthleteEventNote)
-class AthleteEventNoteAdmin(admin.ModelAdmin):
+class AthleteEventNoteAdmin(RunOrderBoardAdminMixin, admin.ModelAdmin):
     list_display = ('athlete_competition', 'event', 'note_type', 'note_value', 'updated_at')
     list_filter = ('event', 'note_type')
     search_fields = ('athlete_competition__athlete__user__first_name', 'athlete_competition__athlete__user__last_name', 'note_value')
@@ -275,12 +320,35 @@ class LaneAssignmentAdmin(admin.ModelAdmin):
     list_filter = ('event', 'lane_number', 'heat_number')
     search_fields = ('athlete_competition__athlete__user__first_name', 'athlete_competition__athlete__user__last_name')
 
+    # Run-order rows copy their lane from here; syncing them also retires the boards.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        sync_run_order_lanes(obj.event, [obj.athlete_competition_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        sync_run_order_lanes(obj.event, [obj.athlete_competition_id])
+
+    def delete_queryset(self, request, queryset):
+        athletes_by_event = {}
+        for assignment in queryset.select_related('event'):
+            athletes_by_event.setdefault(assignment.event, []).append(assignment.athlete_competition_id)
+        super().delete_queryset(request, queryset)
+        for event, ac_ids in athletes_by_event.items():
+            sync_run_order_lanes(event, ac_ids)
+
 @admin.register(CompetitionRunOrder)
-class CompetitionRunOrderAdmin(admin.ModelAdmin):
+class CompetitionRunOrderAdmin(RunOrderBoardAdminMixin, admin.ModelAdmin):
     list_display = ('competition', 'event', 'athlete_competition', 'order', 'status')
     list_filter = ('competition', 'event', 'status')
     search_fields = ('athlete_competition__athlete__user__username', 'athlete_competition__athlete__user__first_name', 'athlete_competition__athlete__user__last_name')
 
+@admin.register(Attempt)
+class AttemptAdmin(RunOrderBoardAdminMixin, admin.ModelAdmin):
+    list_display = ('athlete_competition', 'event', 'attempt_number', 'weight', 'outcome')
+    list_filter = ('event', 'outcome')
+    search_fields = ('athlete_competition__athlete__user__first_name', 'athlete_competition__athlete__user__last_name')
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
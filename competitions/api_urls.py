@@ -1,12 +1,14 @@
 # competitions/api_urls.py
 from django.urls import path
 from .views import CompetitionListView as APICompetitionListView, CompetitionAthletesAPI, api_guide
-from .views import APICompetitionDetailView, APIAthleteCompetitionDetailView, athlete_by_name
+from .views import APICompetitionDetailView, APIAthleteCompetitionDetailView, athlete_by_name, CompetitionScoresAPI
 from competitions.views.competition_api import (
     leaderboard,
     current_competitors,
     up_next_competitors,
     current_event,
+    broadcast_state,
+    broadcast_stream,
     competition_events,
     competition_weight_classes, serve_profile_picture,
 )
@@ -18,10 +20,13 @@ urlpatterns = [
     path('competition/<int:id>/', APICompetitionDetailView.as_view(), name='competition-detail'),
     path('competition/<int:pk>/athletes/', CompetitionAthletesAPI.as_view(), name='competition-athletes'),
     path('competition/<int:comp_id>/athlete-by-name/', athlete_by_name),
+    path('competition/<int:pk>/scores/', CompetitionScoresAPI.as_view(), name='competition-scores'),
     path("api-guide/", api_guide, name="api_guide"),
     path('competition/leaderboard',           leaderboard,            name='api_leaderboard'),
     path('competition/current-competitors',   current_competitors,    name='api_current_competitors'),
     path('competition/up-next-competitors',   up_next_competitors,    name='api_up_next_competitors'),
     path('competition/current-event',         current_event,          name='api_current_event'),
+    path('competition/broadcast-state',       broadcast_state,        name='api_broadcast_state'),
+    path('competition/broadcast-stream',      broadcast_stream,       name='api_broadcast_stream'),
     path('api/profile-pic/<int:user_id>/', serve_profile_picture, name='serve_profile_picture'),
 ]
\ No newline at end of file
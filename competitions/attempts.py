@@ -0,0 +1,104 @@
+"""
+Max-attempt engine for last-man-standing events.
+
+Each requested or taken attempt is an ``Attempt`` row. The pending ones make
+up the bar-loading order: lightest weight first, then lower attempt number,
+then lot order (the athlete's registration id). The judge console promotes
+lifters in this order (see ``competitions.lifting_order``), and athletes
+change their next attempt by updating their pending row, so the run order
+never has to be regenerated.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from competitions.models import Attempt
+from competitions.scoring import submit_scores
+
+LOADING_ORDER = ('weight', 'attempt_number', 'athlete_competition_id')
+
+
+def loading_order(event, limit=None):
+    """
+    The event's pending attempts in loading order, as (weight,
+    attempt_number, athlete_competition_id) tuples, the first ``limit`` or
+    all of them.
+    """
+    pending = (
+        Attempt.objects
+        .filter(event=event, outcome='pending')
+        .order_by(*LOADING_ORDER)
+        .values_list(*LOADING_ORDER)
+    )
+    return list(pending if limit is None else pending[:limit])
+
+
+def has_pending_attempt(athlete_competition_id, event):
+    return Attempt.objects.filter(
+        athlete_competition_id=athlete_competition_id, event=event, outcome='pending'
+    ).exists()
+
+
+def request_attempt(athlete_competition, event, weight):
+    """
+    Sets the weight of an athlete's next attempt.
+
+    Updates their pending attempt if they have one, otherwise opens the next
+    one. Raises ValidationError if the weight is below their last attempt.
+    """
+    with transaction.atomic():
+        attempts = list(
+            Attempt.objects
+            .select_for_update()
+            .filter(athlete_competition=athlete_competition, event=event)
+            .order_by('attempt_number')
+        )
+        taken = [a for a in attempts if a.outcome != 'pending']
+        if taken and weight < taken[-1].weight:
+            raise ValidationError(f"Next attempt must be at least {taken[-1].weight:g}.")
+
+        pending = next((a for a in attempts if a.outcome == 'pending'), None)
+        if pending:
+            pending.weight = weight
+            pending.save(update_fields=['weight', 'updated_at'])
+            return pending
+        return Attempt.objects.create(
+            athlete_competition=athlete_competition,
+            event=event,
+            attempt_number=len(taken) + 1,
+            weight=weight,
+        )
+
+
+def record_attempt(athlete_competition, event, made, weight=None):
+    """
+    Records the outcome of an athlete's pending attempt.
+
+    ``weight`` overrides the requested weight, and opens an attempt if none
+    was requested; like a request, it may not be below the last attempt. A
+    good lift re-scores the event with the athlete's best good weight.
+    Raises ValidationError for a weight below the last attempt, or for no
+    weight when none was requested. Returns the attempt.
+    """
+    with transaction.atomic():
+        if weight is not None:
+            attempt = request_attempt(athlete_competition, event, weight)
+        else:
+            attempt = (
+                Attempt.objects
+                .select_for_update()
+                .filter(athlete_competition=athlete_competition, event=event, outcome='pending')
+                .first()
+            )
+            if attempt is None:
+                raise ValidationError("No attempt has been requested.")
+        attempt.outcome = 'good' if made else 'missed'
+        attempt.save(update_fields=['outcome', 'updated_at'])
+
+        if made:
+            best = max(
+                Attempt.objects
+                .filter(athlete_competition=athlete_competition, event=event, outcome='good')
+                .values_list('weight', flat=True)
+            )
+            submit_scores(athlete_competition.competition, [(athlete_competition.pk, event.pk, f"{best:g}")])
+    return attempt
@@ -1,10 +1,42 @@
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from collections import deque
+from urllib.parse import parse_qs
+import asyncio
 import json
+import time
+
+from competitions.live import catch_up, competition_group_name, snapshot_message
+
 
 class ScoreUpdateConsumer(AsyncWebsocketConsumer):
+    """
+    Read-only score feed for a competition.
+
+    Only the scoring engine publishes to the group. Clients are not expected
+    to send anything; one that keeps sending is disconnected.
+
+    Outgoing messages go through a bounded outbox drained by one writer task.
+    The outbox only bounds how far the writer can fall behind the group: when
+    it fills up, or a message has waited longer than ``outbox_max_age``, the
+    backlog is dropped and a single snapshot is sent instead. Whether a send
+    waits for the socket depends on the server (daphne buffers it, so a slow
+    reader there is not detected), so this is a cap on per-connection memory
+    and staleness rather than true socket backpressure.
+    """
+    inbound_limit = 10
+    inbound_window = 10  # seconds
+    outbox_size = 50
+    outbox_max_age = 5  # seconds
+    rate_limited_close_code = 4008
+
     async def connect(self):
         self.competition_id = self.scope['url_route']['kwargs']['competition_pk']
-        self.competition_group_name = f'competition_{self.competition_id}'
+        self.competition_group_name = competition_group_name(self.competition_id)
+        self.inbound = deque()
+        self.outbox = asyncio.Queue(maxsize=self.outbox_size)
+        self.resync = False
+        self.writer = None
 
         # Join competition group
         await self.channel_layer.group_add(
@@ -13,11 +45,27 @@ class ScoreUpdateConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        self.writer = asyncio.create_task(self.drain_outbox())
+
+        # A reconnecting client passes the last version it saw and is sent
+        # what it missed. Anything published meanwhile may arrive twice;
+        # clients skip versions they already have.
+        since = self.get_since_version()
+        if since is not None:
+            for message in await database_sync_to_async(catch_up)(self.competition_id, since):
+                self.enqueue(message)
 
-        # Print statement to check connection and competition_pk
-        print(f"WebSocket connection established to competition_pk: {self.competition_id}")
+    def get_since_version(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return max(int(query['since'][0]), 0)
+        except (KeyError, IndexError, ValueError):
+            return None
 
     async def disconnect(self, close_code):
+        if self.writer:
+            self.writer.cancel()
+
         # Leave competition group
         await self.channel_layer.group_discard(
             self.competition_group_name,
@@ -25,24 +73,43 @@ class ScoreUpdateConsumer(AsyncWebsocketConsumer):
         )
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-
-        # Send message to competition group
-        await self.channel_layer.group_send(
-            self.competition_group_name,
-            {
-                'type': 'score_update',
-                'message': message
-            }
-        )
+    async def receive(self, text_data=None, bytes_data=None):
+        now = time.monotonic()
+        self.inbound.append(now)
+        while now - self.inbound[0] > self.inbound_window:
+            self.inbound.popleft()
+        if len(self.inbound) > self.inbound_limit:
+            await self.close(code=self.rate_limited_close_code)
 
     # Receive message from competition group
     async def score_update(self, event):
-        message = event['message']
+        self.enqueue(event['message'])
+
+    def enqueue(self, message):
+        if self.resync:
+            # A snapshot is already on its way and will include this change.
+            return
+        try:
+            self.outbox.put_nowait((time.monotonic(), message))
+        except asyncio.QueueFull:
+            self.request_resync()
+
+    def request_resync(self):
+        while not self.outbox.empty():
+            self.outbox.get_nowait()
+        self.resync = True
+        self.outbox.put_nowait((time.monotonic(), None))
 
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'message': message
-        }))
\ No newline at end of file
+    async def drain_outbox(self):
+        while True:
+            queued_at, message = await self.outbox.get()
+            if not self.resync and time.monotonic() - queued_at > self.outbox_max_age:
+                # The writer is falling behind; skip the stale backlog.
+                self.request_resync()
+                continue
+            if self.resync:
+                self.resync = False
+                message = await database_sync_to_async(snapshot_message)(self.competition_id)
+            if message is not None:
+                # Send message to WebSocket
+                await self.send(text_data=json.dumps({'message': message}))
@@ -0,0 +1,45 @@
+"""
+The order lifters take their turns in within a lane.
+
+Lifters go by heat, then run order. On max events, athletes with a pending
+attempt go first, in bar-loading order (lightest weight, then lower attempt
+number, then lot), followed by the rest by heat and order. The judge
+console promotes in this order, and every view of the lane queues sorts
+with it too, so the lifter shown on deck is the one promoted next.
+"""
+from django.db.models import Case, F, OuterRef, Subquery, When
+
+from competitions.models import Attempt, Event
+
+
+def in_lifting_order(run_orders, events, *leading):
+    """
+    Orders run-order rows by lifting order, after any ``leading`` fields
+    (such as the lane) that group the queues.
+
+    ``events`` is the event, or the events, the rows belong to. Only max
+    events are sorted by their pending attempts; other events keep plain
+    heat and order.
+    """
+    if isinstance(events, Event):
+        events = [events]
+    if not any(event.weight_type == 'max' for event in events):
+        return run_orders.order_by(*leading, 'heat_number', 'order')
+
+    pending = Attempt.objects.filter(
+        event=OuterRef('event'),
+        athlete_competition=OuterRef('athlete_competition'),
+        outcome='pending',
+    )
+    return run_orders.annotate(
+        next_weight=Subquery(pending.values('weight')[:1]),
+        next_attempt_number=Subquery(pending.values('attempt_number')[:1]),
+    ).order_by(
+        *leading,
+        F('next_weight').asc(nulls_last=True),
+        F('next_attempt_number').asc(nulls_last=True),
+        # The lot only breaks ties between pending attempts; the rest go by heat and order.
+        Case(When(next_weight__isnull=False, then=F('athlete_competition_id'))).asc(nulls_last=True),
+        'heat_number',
+        'order',
+    )
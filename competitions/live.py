@@ -0,0 +1,271 @@
+"""
+Live score feed.
+
+After the scoring engine commits a change it publishes a delta to the
+competition's channel group: the results whose value, event rank or points
+changed, the registrations whose total or overall rank changed, and the
+current and on-deck lifter of every lane of the affected events. Pages
+subscribed to ``ws/competitions/<pk>/`` patch themselves from it instead of
+reloading.
+
+Every delta carries the competition's next version number and is kept for a
+while in the cache, so a client that reconnects with ``?since=<version>`` is
+sent just the deltas it missed, or a full snapshot when the gap is too large.
+
+Deltas committed within ``LIVE_SCORE_COALESCE_WINDOW`` seconds of each other
+are merged and sent as one, so a judge entering a flight score by score
+costs one fan-out per window rather than one per keystroke. Coalescing is per
+process; with several workers each sends its own merged delta, so deltas can
+reach a client out of version order. Clients apply them strictly in order
+and reconnect with ``?since=`` when they see a gap.
+"""
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from competitions.lifting_order import in_lifting_order
+from competitions.models import Competition, CompetitionRunOrder, Event
+from competitions.standings import get_standings
+from competitions.vmix import touch_feeds
+
+logger = logging.getLogger(__name__)
+
+# How many recent deltas a reconnecting client can catch up on, and for how
+# long they are kept, before it is sent a full snapshot instead.
+DELTA_LOG_SIZE = 500
+DELTA_LOG_TIMEOUT = 60 * 60
+
+# Deltas waiting for their competition's coalescing window to close.
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def competition_group_name(competition_id):
+    return f'competition_{competition_id}'
+
+
+def version_cache_key(competition_id):
+    return f'competition:{competition_id}:live_version'
+
+
+def delta_cache_key(competition_id, version):
+    return f'competition:{competition_id}:delta:{version}'
+
+
+def current_version(competition_id):
+    return cache.get(version_cache_key(competition_id), 0)
+
+
+def next_version(competition_id):
+    key = version_cache_key(competition_id)
+    cache.add(key, 0, None)
+    return cache.incr(key)
+
+
+def run_order_version_cache_key(event_id):
+    return f'event:{event_id}:run_order_version'
+
+
+def run_order_version(event_id):
+    return cache.get(run_order_version_cache_key(event_id), 0)
+
+
+def touch_run_order(event_ids):
+    """
+    Moves the given events to a new run-order version, retiring cached boards
+    and their competitions' vMix feeds.
+    """
+    event_ids = list(event_ids)
+    for event_id in event_ids:
+        key = run_order_version_cache_key(event_id)
+        cache.add(key, 0, None)
+        cache.incr(key)
+    if event_ids:
+        touch_feeds(set(Event.objects.filter(pk__in=event_ids).values_list('competition_id', flat=True)))
+
+
+def result_delta(result):
+    return {
+        'athlete_id': result.athlete_competition_id,
+        'event_id': result.event_id,
+        'value': result.value,
+        'event_rank': result.event_rank,
+        'points_earned': float(result.points_earned) if result.points_earned is not None else None,
+    }
+
+
+def standing_delta(athlete_competition):
+    return {
+        'athlete_id': athlete_competition.pk,
+        'rank': athlete_competition.rank,
+        'total_points': athlete_competition.total_points,
+    }
+
+
+def _lifter(run_order):
+    return {
+        'run_order_id': run_order.pk,
+        'athlete_id': run_order.athlete_competition_id,
+        'name': run_order.athlete_competition.athlete.user.get_full_name(),
+        'heat': run_order.heat_number,
+    }
+
+
+def lane_state(event_ids):
+    """
+    Current and on-deck lifter of every lane of the given events.
+    """
+    if not event_ids:
+        return []
+    lanes = {}
+    run_orders = in_lifting_order(
+        CompetitionRunOrder.objects
+        .filter(event_id__in=event_ids, status__in=['current', 'pending'])
+        .select_related('athlete_competition__athlete__user'),
+        Event.objects.filter(pk__in=event_ids).only('pk', 'weight_type'),
+        'event_id', 'lane_number',
+    )
+    for ro in run_orders:
+        lane = lanes.setdefault((ro.event_id, ro.lane_number), {
+            'event_id': ro.event_id,
+            'lane': ro.lane_number,
+            'current': None,
+            'on_deck': None,
+        })
+        if ro.status == 'current' and lane['current'] is None:
+            lane['current'] = _lifter(ro)
+        elif ro.status == 'pending' and lane['on_deck'] is None:
+            lane['on_deck'] = _lifter(ro)
+    return list(lanes.values())
+
+
+def send_delta(competition_id, message, event_ids=()):
+    version = next_version(competition_id)
+    message = dict(message, version=version, lanes=lane_state(event_ids))
+    cache.set(delta_cache_key(competition_id, version), message, DELTA_LOG_TIMEOUT)
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return message
+    async_to_sync(channel_layer.group_send)(
+        competition_group_name(competition_id),
+        {
+            'type': 'score_update',
+            'message': message,
+        }
+    )
+    return message
+
+
+def publish_delta(competition_id, results=(), standings=(), event_ids=()):
+    """
+    Publishes a delta once the current transaction commits.
+
+    ``results`` and ``standings`` are serialized right away; lanes are read
+    after the commit so they reflect any run-order changes made alongside
+    the scores. The events' cached run-order boards and the competition's
+    vMix feeds are retired on commit. A failed send is logged rather than
+    failing the request.
+    """
+    message = {
+        'type': 'delta',
+        'competition_id': competition_id,
+        'results': [result_delta(result) for result in results],
+        'standings': [standing_delta(ac) for ac in standings],
+    }
+    event_ids = set(event_ids)
+    if event_ids:
+        # Retiring the boards retires the competition's feeds too
+        transaction.on_commit(lambda: touch_run_order(event_ids), robust=True)
+    else:
+        transaction.on_commit(lambda: touch_feeds([competition_id]), robust=True)
+    transaction.on_commit(lambda: queue_delta(competition_id, message, event_ids), robust=True)
+    return message
+
+
+def queue_delta(competition_id, message, event_ids=()):
+    """
+    Merges a delta into the competition's open window, opening one if needed.
+
+    Later values for the same result or registration replace earlier ones.
+    With a window of 0 the delta is sent right away.
+    """
+    window = settings.LIVE_SCORE_COALESCE_WINDOW
+    if window <= 0:
+        return send_delta(competition_id, message, sorted(event_ids))
+
+    with _pending_lock:
+        pending = _pending.get(competition_id)
+        if pending is None:
+            pending = _pending[competition_id] = {'results': {}, 'standings': {}, 'event_ids': set()}
+            timer = threading.Timer(window, flush_deltas, args=[competition_id])
+            timer.daemon = True
+            timer.start()
+        for result in message['results']:
+            pending['results'][(result['athlete_id'], result['event_id'])] = result
+        for standing in message['standings']:
+            pending['standings'][standing['athlete_id']] = standing
+        pending['event_ids'].update(event_ids)
+
+
+def flush_deltas(competition_id):
+    """
+    Sends the merged delta of a closed window.
+    """
+    with _pending_lock:
+        pending = _pending.pop(competition_id, None)
+    if pending is None:
+        return None
+    message = {
+        'type': 'delta',
+        'competition_id': competition_id,
+        'results': list(pending['results'].values()),
+        'standings': list(pending['standings'].values()),
+    }
+    try:
+        return send_delta(competition_id, message, sorted(pending['event_ids']))
+    except Exception:
+        logger.exception(f"Failed to publish live scores for competition {competition_id}")
+    finally:
+        # Runs on a timer thread, which must not leave database connections open.
+        connections.close_all()
+
+
+def snapshot_message(competition_id):
+    """
+    The full live state: the standings snapshot and the lanes of the current event.
+    """
+    competition = Competition.objects.filter(pk=competition_id).first()
+    if competition is None:
+        return None
+    standings = get_standings(competition)
+    return {
+        'type': 'snapshot',
+        'competition_id': competition_id,
+        'version': standings['version'],
+        'standings': standings,
+        'lanes': lane_state([competition.current_event_id] if competition.current_event_id else []),
+    }
+
+
+def catch_up(competition_id, since):
+    """
+    Messages that bring a client at version ``since`` up to date.
+
+    Returns the missed deltas in order, or a single snapshot if any of them
+    has fallen out of the log.
+    """
+    version = current_version(competition_id)
+    if since == version:
+        return []
+    if since > version or version - since > DELTA_LOG_SIZE:
+        return [snapshot_message(competition_id)]
+    keys = [delta_cache_key(competition_id, v) for v in range(since + 1, version + 1)]
+    deltas = cache.get_many(keys)
+    if len(deltas) != len(keys):
+        return [snapshot_message(competition_id)]
+    return [deltas[key] for key in keys]
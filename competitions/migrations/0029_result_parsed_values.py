@@ -0,0 +1,84 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:48
+
+import math
+
+from django.db import migrations, models
+
+# Frozen copy of competitions.models.parse_performance_value as of this
+# migration, so later changes to the live parser don't alter the backfill.
+TIME_SORT_SCALE = 100000
+
+
+def parse_performance_value(weight_type, value):
+    parsed = {"implements_completed": None, "elapsed_seconds": None, "magnitude": None, "sort_key": None}
+    value = (value or "").strip()
+    if not value:
+        return parsed
+
+    try:
+        if weight_type == "time":
+            implements, clock = value.split("+")
+            seconds = 0.0
+            for part in clock.split(":"):
+                seconds = seconds * 60 + float(part)
+            implements = int(implements)
+            if implements < 0 or seconds < 0 or not math.isfinite(seconds):
+                return parsed
+            parsed.update(
+                implements_completed=implements,
+                elapsed_seconds=seconds,
+                sort_key=implements * TIME_SORT_SCALE - seconds,
+            )
+        else:
+            magnitude = float(value)
+            if not math.isfinite(magnitude) or magnitude <= 0:
+                return parsed
+            parsed.update(magnitude=magnitude, sort_key=magnitude)
+    except ValueError:
+        pass
+    return parsed
+
+
+def backfill_parsed_values(apps, schema_editor):
+    Result = apps.get_model("competitions", "Result")
+    fields = ["implements_completed", "elapsed_seconds", "magnitude", "sort_key"]
+    results = list(Result.objects.select_related("event").exclude(value=""))
+    for result in results:
+        for field, parsed in parse_performance_value(result.event.weight_type, result.value).items():
+            setattr(result, field, parsed)
+    Result.objects.bulk_update(results, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0028_remove_federation_slug_competition_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='elapsed_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='implements_completed',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='magnitude',
+            field=models.FloatField(blank=True, help_text='Numeric reps, distance, height or weight.', null=True),
+        ),
+        migrations.AddField(
+            model_name='result',
+            name='sort_key',
+            field=models.FloatField(blank=True, help_text='Higher is better. Empty when there is no score.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['event', 'sort_key'], name='result_event_sort_key_idx'),
+        ),
+        migrations.RunPython(backfill_parsed_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:50
+
+from django.db import migrations
+
+
+def remove_duplicate_results(apps, schema_editor):
+    # Keep one result per athlete and event: the latest one that has a score,
+    # falling back to the latest one.
+    Result = apps.get_model("competitions", "Result")
+    kept = {}
+    duplicates = []
+    for result in Result.objects.only("athlete_competition_id", "event_id", "value").order_by("pk").iterator():
+        key = (result.athlete_competition_id, result.event_id)
+        current = kept.get(key)
+        if current is None:
+            kept[key] = result
+        elif result.value or not current.value:
+            duplicates.append(current.pk)
+            kept[key] = result
+        else:
+            duplicates.append(result.pk)
+    Result.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0029_result_parsed_values'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_results, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='result',
+            unique_together={('athlete_competition', 'event')},
+        ),
+    ]
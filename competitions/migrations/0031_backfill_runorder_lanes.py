@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+def backfill_lanes(apps, schema_editor):
+    CompetitionRunOrder = apps.get_model("competitions", "CompetitionRunOrder")
+    LaneAssignment = apps.get_model("competitions", "LaneAssignment")
+    assignments = {
+        (la.athlete_competition_id, la.event_id): (la.lane_number, la.heat_number)
+        for la in LaneAssignment.objects.all()
+    }
+    run_orders = list(CompetitionRunOrder.objects.only("athlete_competition_id", "event_id", "lane_number", "heat_number"))
+    for ro in run_orders:
+        ro.lane_number, ro.heat_number = assignments.get(
+            (ro.athlete_competition_id, ro.event_id),
+            (ro.lane_number or 1, ro.heat_number or 1),
+        )
+    CompetitionRunOrder.objects.bulk_update(run_orders, ["lane_number", "heat_number"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0030_result_unique_per_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_lanes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0031_backfill_runorder_lanes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='competitionrunorder',
+            name='heat_number',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='competitionrunorder',
+            name='lane_number',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='competitionrunorder',
+            index=models.Index(
+                fields=['event', 'lane_number', 'status', 'heat_number', 'order'], name='runorder_lane_queue_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0032_runorder_lane_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_number', models.PositiveSmallIntegerField()),
+                ('weight', models.FloatField()),
+                ('outcome', models.CharField(choices=[('pending', 'Pending'), ('good', 'Good Lift'), ('missed', 'Missed')], default='pending', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('athlete_competition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='competitions.athletecompetition')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='competitions.event')),
+            ],
+            options={
+                'ordering': ['event', 'weight', 'attempt_number', 'athlete_competition'],
+                'indexes': [models.Index(fields=['event', 'outcome'], name='attempt_event_outcome_idx')],
+                'unique_together': {('athlete_competition', 'event', 'attempt_number')},
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 import json
+import math
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.conf import settings
@@ -492,6 +493,19 @@ class Event(models.Model):
     def __str__(self):
         return f"{self.name} (Order {self.order})"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Results are parsed for the weight type they were saved under
+        weight_type_changed = (
+            self.pk is not None
+            and (update_fields is None or 'weight_type' in update_fields)
+            and Event.objects.filter(pk=self.pk).exclude(weight_type=self.weight_type).exists()
+        )
+        super().save(*args, **kwargs)
+        if weight_type_changed:
+            from competitions.scoring import reparse_event  # scoring imports models
+            reparse_event(self)
+
 
 
 class EventImplement(models.Model):
@@ -578,6 +592,49 @@ class AthleteCompetition(models.Model):
     def __str__(self):
         return f"{self.athlete.user.username} - {self.competition.name}"
 
+# Time events sort on implements completed first, then on elapsed time.
+# Scaling implements past any realistic event duration lets a single
+# descending sort key order both.
+TIME_SORT_SCALE = 100000
+
+
+def parse_performance_value(weight_type, value):
+    """
+    Parses a raw ``Result.value`` into typed, sortable columns.
+
+    Time events are entered as "implements+MM:SS" (or "implements+HH:MM:SS");
+    every other event type is a plain number. ``sort_key`` is higher for
+    better performances and None when there is no usable score.
+    """
+    parsed = {'implements_completed': None, 'elapsed_seconds': None, 'magnitude': None, 'sort_key': None}
+    value = (value or '').strip()
+    if not value:
+        return parsed
+
+    try:
+        if weight_type == 'time':
+            implements, clock = value.split('+')
+            seconds = 0.0
+            for part in clock.split(':'):
+                seconds = seconds * 60 + float(part)
+            implements = int(implements)
+            if implements < 0 or seconds < 0 or not math.isfinite(seconds):
+                return parsed
+            parsed.update(
+                implements_completed=implements,
+                elapsed_seconds=seconds,
+                sort_key=implements * TIME_SORT_SCALE - seconds,
+            )
+        else:
+            magnitude = float(value)
+            if not math.isfinite(magnitude) or magnitude <= 0:
+                return parsed
+            parsed.update(magnitude=magnitude, sort_key=magnitude)
+    except ValueError:
+        pass
+    return parsed
+
+
 class Result(models.Model):
     athlete_competition = models.ForeignKey(
         AthleteCompetition, on_delete=models.CASCADE, related_name='results'
@@ -599,8 +656,45 @@ class Result(models.Model):
         help_text="Performance value (e.g., weight lifted, distance, reps, etc.)."
     )
 
+    # Parsed from value on save; ranking orders by sort_key instead of re-parsing strings.
+    implements_completed = models.PositiveSmallIntegerField(null=True, blank=True)
+    elapsed_seconds = models.FloatField(null=True, blank=True)
+    magnitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Numeric reps, distance, height or weight."
+    )
+    sort_key = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Higher is better. Empty when there is no score."
+    )
+
+    PARSED_FIELDS = ['implements_completed', 'elapsed_seconds', 'magnitude', 'sort_key']
+
     class Meta:
+        unique_together = ('athlete_competition', 'event')
         ordering = ["event__order", "event_rank"]
+        indexes = [
+            models.Index(fields=['event', 'sort_key'], name='result_event_sort_key_idx'),
+        ]
+
+    def parse_value(self, weight_type=None):
+        """
+        Refreshes the parsed columns from value.
+        """
+        weight_type = weight_type or self.event.weight_type
+        for field, parsed in parse_performance_value(weight_type, self.value).items():
+            setattr(self, field, parsed)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.parse_value()
+        elif 'value' in update_fields:
+            self.parse_value()
+            kwargs['update_fields'] = {*update_fields, *self.PARSED_FIELDS}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.athlete_competition.athlete.user.get_full_name()} - {self.event.name}"
@@ -693,9 +787,10 @@ class CompetitionRunOrder(models.Model):
 
     order = models.PositiveIntegerField()
 
-    # Optional fields for additional context
-    lane_number = models.PositiveIntegerField(null=True, blank=True)
-    heat_number = models.PositiveIntegerField(null=True, blank=True)
+    # The lane and heat the athlete lifts in, copied from their LaneAssignment
+    # (lane 1, heat 1 without one). The lane queues are read from these.
+    lane_number = models.PositiveIntegerField(default=1)
+    heat_number = models.PositiveIntegerField(default=1)
 
     # Tracking timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -705,12 +800,50 @@ class CompetitionRunOrder(models.Model):
 
     class Meta:
         ordering = ['event', 'order']
+        indexes = [
+            # Serves the next-pending-in-lane lookup, which goes by heat, then order
+            models.Index(
+                fields=['event', 'lane_number', 'status', 'heat_number', 'order'], name='runorder_lane_queue_idx'
+            ),
+        ]
 
 
     def __str__(self):
         return (f"{self.athlete_competition.athlete.user.get_full_name()} - "
                 f"{self.event.name} (Order {self.order}, Status: {self.status})")
 
+
+class Attempt(models.Model):
+    """
+    One requested or taken attempt on a max-weight event.
+
+    Pending attempts are the bar-loading queue: lightest weight first, then
+    lower attempt number, then lot order (registration order).
+    """
+    OUTCOME_CHOICES = [
+        ('pending', 'Pending'),
+        ('good', 'Good Lift'),
+        ('missed', 'Missed'),
+    ]
+
+    athlete_competition = models.ForeignKey(AthleteCompetition, on_delete=models.CASCADE, related_name='attempts')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attempts')
+    attempt_number = models.PositiveSmallIntegerField()
+    weight = models.FloatField()
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, default='pending')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('athlete_competition', 'event', 'attempt_number')
+        ordering = ['event', 'weight', 'attempt_number', 'athlete_competition']
+        indexes = [
+            models.Index(fields=['event', 'outcome'], name='attempt_event_outcome_idx'),
+        ]
+
+    def __str__(self):
+        return (f"{self.athlete_competition.athlete.user.get_full_name()} - "
+                f"{self.event.name} attempt {self.attempt_number}: {self.weight} ({self.outcome})")
+
 UNIT_CHOICES = [
     ('lbs', 'Pounds (lbs)'),
     ('kg', 'Kilograms (kg)'),
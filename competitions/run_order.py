@@ -0,0 +1,472 @@
+"""
+Run-order strategies.
+
+A strategy plans the order athletes take an event in, as a list of
+(athlete_competition, lane, heat) tuples. Strategies read from a
+``RunOrderData``, which loads each kind of data they may need with a single
+query the first time it is used, and ``generate_run_order`` saves the plan
+with one bulk insert.
+
+Each run-order row carries the athlete's lane and heat, copied from their
+``LaneAssignment`` when the order is planned and kept in step with it by
+``set_lane_assignments``, so lane queues are read from the rows alone.
+Strategies registered with ``plans_lanes`` choose lanes and heats
+themselves; their plan is saved as the event's lane assignments too.
+
+The judge console renders from a run-order board: lanes, current and on-deck
+lifters, pending and completed lists, scores and notes for one event. Boards
+are cached per (event, run-order version), and every change to an event's
+run order, scores or notes moves it to a new version.
+"""
+from collections import namedtuple
+from functools import cached_property
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from competitions.attempts import loading_order
+from competitions.lifting_order import in_lifting_order
+from competitions.live import run_order_version, touch_run_order
+from competitions.models import AthleteCompetition, AthleteEventNote, CompetitionRunOrder, LaneAssignment, Result
+
+RunOrderStrategy = namedtuple('RunOrderStrategy', ['key', 'label', 'plan', 'plans_lanes'])
+
+RUN_ORDER_STRATEGIES = {}
+DEFAULT_RUN_ORDER_STRATEGY = 'division_signup'
+
+# Boards are keyed by version. Run-order, score and note changes and removed
+# registrations move to a new one; the timeout bounds how long other edits
+# (athlete names, divisions, weight classes) take to show up.
+RUN_ORDER_BOARD_TIMEOUT = 60 * 5
+
+
+def register_strategy(key, label, plans_lanes=False):
+    def decorator(plan):
+        RUN_ORDER_STRATEGIES[key] = RunOrderStrategy(key, label, plan, plans_lanes)
+        return plan
+    return decorator
+
+
+class RunOrderData:
+    """
+    The data strategies plan from, loaded lazily and at most once.
+    """
+
+    def __init__(self, competition, event):
+        self.competition = competition
+        self.event = event
+
+    @cached_property
+    def athlete_competitions(self):
+        """
+        Registrations in flight order, by signup time within a flight.
+        """
+        return list(
+            AthleteCompetition.objects
+            .filter(competition=self.competition)
+            .select_related('division', 'athlete__user', 'weight_class')
+            .order_by('athlete__gender', 'division__predefined_name', 'weight_class__name', 'registration_date')
+        )
+
+    @cached_property
+    def lane_assignments(self):
+        return {la.athlete_competition_id: la for la in LaneAssignment.objects.filter(event=self.event)}
+
+    @cached_property
+    def loading_order(self):
+        return loading_order(self.event)
+
+    @cached_property
+    def opening_weights(self):
+        """
+        The lowest weight each athlete has asked for on this event in their notes.
+        """
+        weights = {}
+        notes = AthleteEventNote.objects.filter(
+            event=self.event,
+            athlete_competition__competition=self.competition,
+            note_type__in=['opening_weight', 'next_attempt'],
+        ).exclude(note_value__isnull=True).values_list('athlete_competition_id', 'note_value')
+        for ac_id, value in notes:
+            try:
+                weight = float(value)
+            except (TypeError, ValueError):
+                continue
+            weights[ac_id] = min(weight, weights.get(ac_id, weight))
+        return weights
+
+    def assigned_slot(self, ac):
+        assignment = self.lane_assignments.get(ac.pk)
+        if assignment:
+            return ac, assignment.lane_number, assignment.heat_number
+        return ac, 1, 1
+
+
+def flight_label(ac):
+    division_label = (ac.division.predefined_name or ac.division.custom_name) if ac.division else None
+    return (
+        ac.athlete.gender,
+        division_label or "Unassigned",
+        ac.weight_class.name if ac.weight_class else "Unassigned",
+    )
+
+
+def _by_flight(athlete_competitions):
+    """
+    Groups registrations by flight, keeping flights in the order first seen.
+    """
+    flights = {}
+    for ac in athlete_competitions:
+        flights.setdefault(flight_label(ac), []).append(ac)
+    return list(flights.values())
+
+
+@register_strategy('division_signup', 'Division Order (Default)')
+def division_signup(data):
+    """
+    Flight by flight, athletes in signup order, on their assigned lanes.
+    """
+    return [data.assigned_slot(ac) for flight in _by_flight(data.athlete_competitions) for ac in flight]
+
+
+@register_strategy('last_man_standing', 'Last Man Standing Order')
+def last_man_standing(data):
+    """
+    Athletes with a requested weight in bar-loading order, on their assigned lanes.
+
+    Pending attempts come in loading order; athletes who have only
+    noted an opener join at that weight as their first attempt. Athletes
+    without either follow in division order.
+    """
+    requests = {lot: (weight, attempt_number, lot) for weight, attempt_number, lot in data.loading_order}
+    for ac_id, weight in data.opening_weights.items():
+        requests.setdefault(ac_id, (weight, 1, ac_id))
+    requested = sorted(
+        (ac for ac in data.athlete_competitions if ac.pk in requests),
+        key=lambda ac: requests[ac.pk],
+    )
+    unrequested = [
+        ac for flight in _by_flight(data.athlete_competitions) for ac in flight if ac.pk not in requests
+    ]
+    return [data.assigned_slot(ac) for ac in requested + unrequested]
+
+
+@register_strategy('reverse_standings', 'Reverse Standings Order')
+def reverse_standings(data):
+    """
+    Flight by flight, the lowest placed athlete first so the leader goes last.
+    Unranked athletes go before ranked ones, in signup order.
+    """
+    slots = []
+    for flight in _by_flight(data.athlete_competitions):
+        flight = sorted(flight, key=lambda ac: (ac.rank is not None, -(ac.rank or 0)))
+        slots.extend(data.assigned_slot(ac) for ac in flight)
+    return slots
+
+
+@register_strategy('heat_balanced', 'Heat Balanced Across Lanes', plans_lanes=True)
+def heat_balanced(data):
+    """
+    Division order, in the lanes and heats planned by ``balance_lanes``.
+    """
+    lanes = max(data.event.number_of_lanes or 1, 1)
+    slots = balance_lanes(data.athlete_competitions, lanes)
+    return [(ac, *slots[ac.pk]) for flight in _by_flight(data.athlete_competitions) for ac in flight]
+
+
+def run_order_choices():
+    return [(strategy.key, strategy.label) for strategy in RUN_ORDER_STRATEGIES.values()]
+
+
+def generate_run_order(competition, event, method=DEFAULT_RUN_ORDER_STRATEGY):
+    """
+    Replaces the event's run order with the one planned by ``method``.
+
+    The first athlete starts as current. When the strategy plans lanes, its
+    lanes and heats are saved as the event's lane assignments so later syncs
+    keep them. Raises KeyError for an unknown method. Returns the saved
+    run-order rows.
+    """
+    strategy = RUN_ORDER_STRATEGIES[method]
+    slots = strategy.plan(RunOrderData(competition, event))
+
+    started_at = timezone.now()
+    run_orders = [
+        CompetitionRunOrder(
+            competition=competition,
+            event=event,
+            athlete_competition=ac,
+            order=order,
+            lane_number=lane,
+            heat_number=heat,
+            status='current' if order == 1 else 'pending',
+            started_at=started_at if order == 1 else None,
+        )
+        for order, (ac, lane, heat) in enumerate(slots, start=1)
+    ]
+    with transaction.atomic():
+        CompetitionRunOrder.objects.filter(competition=competition, event=event).delete()
+        CompetitionRunOrder.objects.bulk_create(run_orders)
+        if strategy.plans_lanes:
+            set_lane_assignments(event, {ac.pk: (lane, heat) for ac, lane, heat in slots})
+        transaction.on_commit(lambda: touch_run_order([event.pk]))
+    return run_orders
+
+
+def sync_run_order_lanes(event, athlete_competition_ids=None):
+    """
+    Copies lane and heat from ``LaneAssignment`` onto the event's run-order
+    rows, lane 1 and heat 1 for athletes without one, in a single update.
+
+    Limited to the given athletes when ``athlete_competition_ids`` is passed.
+    Returns the number of rows updated.
+    """
+    assignment = LaneAssignment.objects.filter(
+        athlete_competition=OuterRef('athlete_competition'),
+        event=OuterRef('event')
+    )
+    run_orders = CompetitionRunOrder.objects.filter(event=event)
+    if athlete_competition_ids is not None:
+        run_orders = run_orders.filter(athlete_competition_id__in=athlete_competition_ids)
+    updated = run_orders.update(
+        lane_number=Coalesce(Subquery(assignment.values('lane_number')[:1]), 1),
+        heat_number=Coalesce(Subquery(assignment.values('heat_number')[:1]), 1),
+        updated_at=timezone.now(),
+    )
+    if updated:
+        transaction.on_commit(lambda: touch_run_order([event.pk]))
+    return updated
+
+
+def set_lane_assignments(event, assignments):
+    """
+    Saves lane assignments for one event and syncs its run order to match.
+
+    ``assignments`` maps athlete_competition ids to a (lane, heat) pair, or
+    to None to clear the athlete's assignment. A heat of None keeps the
+    athlete's current heat. Only assignments that change are written, and
+    the run-order rows of those athletes are updated in the same
+    transaction. Returns the ids of the athletes whose assignment changed.
+    """
+    with transaction.atomic():
+        existing = {
+            la.athlete_competition_id: la
+            for la in LaneAssignment.objects.select_for_update().filter(
+                event=event, athlete_competition_id__in=list(assignments)
+            )
+        }
+        created, updated, deleted = [], [], []
+        for ac_id, slot in assignments.items():
+            assignment = existing.get(ac_id)
+            if slot is None:
+                if assignment:
+                    deleted.append(assignment)
+                continue
+            lane, heat = slot
+            if assignment is None:
+                created.append(LaneAssignment(
+                    athlete_competition_id=ac_id, event=event, lane_number=lane, heat_number=heat or 1
+                ))
+            elif (assignment.lane_number, assignment.heat_number) != (lane, heat or assignment.heat_number):
+                assignment.lane_number = lane
+                assignment.heat_number = heat or assignment.heat_number
+                updated.append(assignment)
+
+        if deleted:
+            LaneAssignment.objects.filter(pk__in=[la.pk for la in deleted]).delete()
+        if created:
+            LaneAssignment.objects.bulk_create(created)
+        if updated:
+            LaneAssignment.objects.bulk_update(updated, ['lane_number', 'heat_number'])
+
+        changed = [la.athlete_competition_id for la in deleted + created + updated]
+        if changed:
+            sync_run_order_lanes(event, changed)
+    return changed
+
+
+def balance_lanes(athlete_competitions, lanes):
+    """
+    Plans lanes and heats for athletes given in flight order.
+
+    Heats run one after another with one athlete per lane. A flight never
+    shares a heat with the flight after it unless it fits in what is left
+    of the heat, so flights stay together, and each heat fills the lanes
+    that have had the fewest athletes so far, so lane counts stay within
+    one of each other. Returns a dict of athlete_competition id to
+    (lane, heat).
+    """
+    lane_counts = dict.fromkeys(range(1, lanes + 1), 0)
+    slots = {}
+    heat, free = 0, []
+    for flight in _by_flight(athlete_competitions):
+        if len(flight) > len(free):
+            heat, free = heat + 1, sorted(lane_counts, key=lambda lane: (lane_counts[lane], lane))
+        for ac in flight:
+            if not free:
+                heat, free = heat + 1, sorted(lane_counts, key=lambda lane: (lane_counts[lane], lane))
+            lane = free.pop(0)
+            lane_counts[lane] += 1
+            slots[ac.pk] = (lane, heat)
+    return slots
+
+
+def auto_assign_lanes(competition, event):
+    """
+    Balances the competition's athletes across the event's lanes and heats
+    with ``balance_lanes`` and saves the result with ``set_lane_assignments``.
+    Returns the ids of the athletes whose assignment changed.
+    """
+    lanes = max(event.number_of_lanes or 1, 1)
+    athlete_competitions = RunOrderData(competition, event).athlete_competitions
+    return set_lane_assignments(event, balance_lanes(athlete_competitions, lanes))
+
+
+def reorder_run_order(event, lanes, partial=False):
+    """
+    Reorders an event's lane queues.
+
+    ``lanes`` maps lane numbers to run-order ids in their new order. The
+    listed rows trade places among themselves: they take the (heat, order)
+    slots they already hold, in the new sequence, so rows not listed keep
+    theirs. A row dropped among another heat's rows joins that heat, and
+    its lane assignment is updated to match. Each list must hold every row
+    in its lane, or with ``partial`` just the rows a drag-and-drop moved.
+    Raises ValidationError for an id listed twice, missing from the event
+    or in a different lane. Returns the rows whose heat or order changed.
+    """
+    listed = [pk for ids in lanes.values() for pk in ids]
+    if len(set(listed)) != len(listed):
+        raise ValidationError("A run order is listed more than once.")
+
+    with transaction.atomic():
+        run_orders = CompetitionRunOrder.objects.select_for_update().filter(event=event)
+        if partial:
+            run_orders = run_orders.filter(pk__in=listed)
+        else:
+            run_orders = run_orders.filter(lane_number__in=list(lanes))
+        rows = {
+            ro.pk: ro
+            for ro in run_orders.only('pk', 'athlete_competition_id', 'lane_number', 'heat_number', 'order')
+        }
+
+        changed, moved = [], {}
+        updated_at = timezone.now()
+        for lane, ids in lanes.items():
+            lane_rows = []
+            for pk in ids:
+                ro = rows.get(pk)
+                if ro is None or ro.lane_number != lane:
+                    raise ValidationError(f"Run order {pk} is not in lane {lane} of {event.name}.")
+                lane_rows.append(ro)
+            if not partial and len(lane_rows) != sum(1 for ro in rows.values() if ro.lane_number == lane):
+                raise ValidationError(f"Lane {lane} must list every athlete in it.")
+
+            for ro, (heat, order) in zip(lane_rows, sorted((ro.heat_number, ro.order) for ro in lane_rows)):
+                if ro.heat_number != heat:
+                    moved[ro.athlete_competition_id] = (lane, heat)
+                if (ro.heat_number, ro.order) != (heat, order):
+                    ro.heat_number, ro.order = heat, order
+                    ro.updated_at = updated_at
+                    changed.append(ro)
+
+        if changed:
+            CompetitionRunOrder.objects.bulk_update(changed, ['heat_number', 'order', 'updated_at'])
+        if moved:
+            # Syncing the moved rows' lanes retires the board on commit
+            set_lane_assignments(event, moved)
+        elif changed:
+            transaction.on_commit(lambda: touch_run_order([event.pk]))
+    return changed
+
+
+def run_order_board_cache_key(event_id, version):
+    return f'event:{event_id}:run_order_board:{version}'
+
+
+def build_run_order_board(event):
+    """
+    Assembles the judge console for an event from three queries.
+
+    Returns a dict of ``run_orders`` in order, ``lanes`` (lane number to its
+    current, on-deck, pending and completed run orders and its heats),
+    ``notes`` (athlete to event to note type to notes) and
+    ``first_pending_index``. Completed run orders carry their ``score`` and
+    ``points``.
+    """
+    run_orders = list(in_lifting_order(
+        CompetitionRunOrder.objects
+        .filter(event=event)
+        .select_related(
+            'athlete_competition__athlete__user',
+            'athlete_competition__division',
+            'athlete_competition__weight_class'
+        )
+        .prefetch_related(
+            Prefetch('athlete_competition__results', queryset=Result.objects.filter(event=event), to_attr='event_results'),
+            Prefetch('athlete_competition__event_notes', queryset=AthleteEventNote.objects.filter(event=event),
+                     to_attr='notes_for_event'),
+        ),
+        event,
+    ))
+
+    lanes = {
+        lane_number: {'current': None, 'on_deck': None, 'pending': [], 'completed': [], 'heats': set()}
+        for lane_number in range(1, (event.number_of_lanes or 1) + 1)
+    }
+    notes = {}
+    first_pending_index = next((i for i, ro in enumerate(run_orders) if ro.status == 'pending'), 0)
+    for ro in run_orders:
+        ac = ro.athlete_competition
+        athlete_notes = notes.setdefault(ac.pk, {})
+        for note in ac.notes_for_event:
+            if note.note_type:
+                athlete_notes.setdefault(event.pk, {}).setdefault(note.note_type, []).append({
+                    'id': note.id,
+                    'value': note.note_value,
+                    'attempt': note.attempt_number or 1,
+                })
+
+        lane = lanes.setdefault(
+            ro.lane_number, {'current': None, 'on_deck': None, 'pending': [], 'completed': [], 'heats': set()}
+        )
+        lane['heats'].add(ro.heat_number)
+        if ro.status == 'current':
+            lane['current'] = ro
+        elif ro.status == 'completed':
+            result = ac.event_results[0] if ac.event_results else None
+            ro.score = result and result.value
+            ro.points = result and result.points_earned or 0
+            lane['completed'].append(ro)
+        else:
+            lane['pending'].append(ro)
+
+    for lane in lanes.values():
+        # Number pending lifters within their lane for display
+        for position, ro in enumerate(lane['pending'], start=1):
+            ro.order = position
+        if lane['pending']:
+            lane['on_deck'] = lane['pending'].pop(0)
+
+    return {
+        'run_orders': run_orders,
+        'lanes': lanes,
+        'notes': notes,
+        'first_pending_index': first_pending_index,
+    }
+
+
+def get_run_order_board(event):
+    """
+    Returns the event's board for its current run-order version, building it on a miss.
+    """
+    key = run_order_board_cache_key(event.pk, run_order_version(event.pk))
+    board = cache.get(key)
+    if board is None:
+        board = build_run_order_board(event)
+        cache.set(key, board, RUN_ORDER_BOARD_TIMEOUT)
+    return board
@@ -0,0 +1,302 @@
+"""
+Scoring engine.
+
+Event points and overall standings are scored per flight: the athletes of a
+competition that share gender, division and weight class. A score change can
+only move the athletes in the same flight, so that is all we recompute.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Rank
+
+from competitions.live import publish_delta
+from competitions.models import AthleteCompetition, Result
+from competitions.standings import refresh_standings
+
+logger = logging.getLogger(__name__)
+
+POINTS_PRECISION = Decimal('0.1')
+
+
+def flight_key(athlete_competition):
+    """
+    Returns the (gender, division_id, weight_class_id) flight of a registration.
+    """
+    return (
+        athlete_competition.athlete.gender,
+        athlete_competition.division_id,
+        athlete_competition.weight_class_id,
+    )
+
+
+def _flight_filter(flight, prefix=''):
+    gender, division_id, weight_class_id = flight
+    return {
+        f'{prefix}athlete__gender': gender,
+        f'{prefix}division_id': division_id,
+        f'{prefix}weight_class_id': weight_class_id,
+    }
+
+
+def _best_first(queryset):
+    return queryset.order_by(F('sort_key').desc(nulls_last=True), 'pk')
+
+
+def rank_event_results(results):
+    """
+    Assigns event_rank and points_earned to the results of one flight.
+
+    Expects results ordered best first by sort_key. The best score earns one
+    point per athlete in the flight, the next one point less, and tied
+    athletes share the average of the points they span. Athletes without a
+    score earn nothing and are ranked last.
+
+    Returns the results whose rank or points changed.
+    """
+    results = list(results)
+    total_athletes = len(results)
+    before = {r.pk: (r.event_rank, r.points_earned) for r in results}
+
+    current_rank = 1
+    tied_results = []
+    for i, result in enumerate(results):
+        if result.sort_key is None:
+            result.points_earned = 0
+            result.event_rank = total_athletes
+            continue
+
+        tied_results.append(result)
+        if i == len(results) - 1 or result.sort_key != results[i + 1].sort_key:
+            start_rank = current_rank
+            end_rank = current_rank + len(tied_results) - 1
+            points = Decimal(sum(total_athletes - r + 1 for r in range(start_rank, end_rank + 1)))
+            points = (points / len(tied_results)).quantize(POINTS_PRECISION)
+            for tied_result in tied_results:
+                tied_result.event_rank = start_rank
+                tied_result.points_earned = points
+            current_rank = end_rank + 1
+            tied_results = []
+
+    return [r for r in results if before[r.pk] != (r.event_rank, r.points_earned)]
+
+
+def standings_queryset(competition_id, flights=None):
+    """
+    Totals and overall ranks for a competition, computed in a single query.
+
+    Each registration is annotated with ``points_sum`` (its summed event points)
+    and ``standing`` (its rank within its flight). Equal totals share a rank and
+    the next rank is skipped (1, 1, 3). Pass ``flights`` to limit the query to
+    those flights.
+    """
+    queryset = AthleteCompetition.objects.filter(competition_id=competition_id)
+    if flights is not None:
+        queryset = queryset.filter(reduce(or_, (Q(**_flight_filter(flight)) for flight in flights), Q(pk__in=[])))
+    return (
+        queryset
+        .annotate(points_sum=Coalesce(Sum('results__points_earned'), Value(Decimal(0)), output_field=DecimalField()))
+        .annotate(standing=Window(
+            expression=Rank(),
+            partition_by=[F('athlete__gender'), F('division_id'), F('weight_class_id')],
+            order_by=F('points_sum').desc(),
+        ))
+        .order_by()
+    )
+
+
+def _write_standings(queryset, competition_id):
+    """
+    Saves changed totals and ranks, and refreshes the live standings snapshot
+    once the surrounding transaction commits.
+    """
+    changed = []
+    for ac in queryset:
+        total_points = int(ac.points_sum)
+        if (ac.total_points, ac.rank) != (total_points, ac.standing):
+            ac.total_points = total_points
+            ac.rank = ac.standing
+            changed.append(ac)
+    AthleteCompetition.objects.bulk_update(changed, ['total_points', 'rank'])
+    transaction.on_commit(lambda: refresh_standings(competition_id), robust=True)
+    return changed
+
+
+def update_flight_standings(competition_id, flight):
+    """
+    Recomputes total points and overall ranks for one flight.
+    """
+    return _write_standings(standings_queryset(competition_id, [flight]), competition_id)
+
+
+def _rescore_flight(event, flight):
+    results = list(_best_first(
+        Result.objects.filter(event=event, **_flight_filter(flight, prefix='athlete_competition__'))
+    ))
+    changed = rank_event_results(results)
+    Result.objects.bulk_update(changed, ['points_earned', 'event_rank'])
+    logger.debug(f"Flight {flight} for event {event.pk}: {len(changed)} of {len(results)} results changed")
+    return results, changed
+
+
+def _delta_results(results, changed, athlete_ids):
+    """
+    The results worth publishing: those re-ranked plus those whose value was edited.
+    """
+    changed_ids = {result.pk for result in changed}
+    return [r for r in results if r.pk in changed_ids or r.athlete_competition_id in athlete_ids]
+
+
+def recalculate_flight(event, flight, athlete_ids=()):
+    """
+    Re-scores one flight for one event, then refreshes that flight's standings.
+
+    ``athlete_ids`` names registrations whose value was edited, so their
+    result is published even if its rank and points did not move.
+    """
+    results, changed = _rescore_flight(event, flight)
+    standings = update_flight_standings(event.competition_id, flight)
+    publish_delta(event.competition_id, _delta_results(results, changed, athlete_ids), standings, [event.pk])
+    return changed
+
+
+def recalculate_for_result(result):
+    """
+    Re-scores the flight affected by a single changed result.
+    """
+    athlete_competition = (
+        AthleteCompetition.objects
+        .select_related('athlete')
+        .get(pk=result.athlete_competition_id)
+    )
+    return recalculate_flight(result.event, flight_key(athlete_competition), {result.athlete_competition_id})
+
+
+def recalculate_event(event):
+    """
+    Re-scores every flight of an event.
+    """
+    results = _best_first(
+        Result.objects
+        .filter(event=event)
+        .select_related('athlete_competition__athlete')
+    )
+    flights = defaultdict(list)
+    for result in results:
+        flights[flight_key(result.athlete_competition)].append(result)
+
+    changed = []
+    for flight_results in flights.values():
+        changed.extend(rank_event_results(flight_results))
+    Result.objects.bulk_update(changed, ['points_earned', 'event_rank'])
+
+    standings = _write_standings(standings_queryset(event.competition_id), event.competition_id)
+    publish_delta(event.competition_id, changed, standings, [event.pk])
+    return changed
+
+
+def reparse_event(event):
+    """
+    Re-parses every result of an event with its current weight type, then
+    re-scores the event. Needed when the weight type changes, since values
+    are only parsed when a result is saved.
+    """
+    results = list(Result.objects.filter(event=event).only('pk', 'value', *Result.PARSED_FIELDS))
+    for result in results:
+        result.parse_value(event.weight_type)
+    Result.objects.bulk_update(results, Result.PARSED_FIELDS)
+    return recalculate_event(event)
+
+
+def update_standings(competition):
+    """
+    Recomputes total points and overall ranks for every flight of a competition.
+    """
+    standings = _write_standings(standings_queryset(competition.pk), competition.pk)
+    publish_delta(competition.pk, standings=standings)
+    return standings
+
+
+def submit_scores(competition, entries):
+    """
+    Records a batch of scores and re-scores each affected flight once.
+
+    ``entries`` is an iterable of (athlete_competition_id, event_id, value)
+    triples; a later entry for the same athlete and event wins. Flight-mates
+    without a result for a scored event get an empty one, so every athlete
+    in the flight is counted when points are assigned. Raises
+    ValidationError if any entry names an athlete or event outside the
+    competition, in which case nothing is saved.
+
+    Returns the saved results.
+    """
+    values = {}
+    for athlete_competition_id, event_id, value in entries:
+        values[(int(athlete_competition_id), int(event_id))] = (value or '').strip()
+    if not values:
+        return []
+
+    athlete_competitions = (
+        AthleteCompetition.objects
+        .filter(competition=competition, pk__in={ac_id for ac_id, _ in values})
+        .select_related('athlete')
+        .in_bulk()
+    )
+    events = competition.events.filter(pk__in={event_id for _, event_id in values}).in_bulk()
+
+    errors = []
+    for ac_id, event_id in values:
+        if ac_id not in athlete_competitions:
+            errors.append(f"Athlete registration {ac_id} is not part of this competition.")
+        if event_id not in events:
+            errors.append(f"Event {event_id} is not part of this competition.")
+    if errors:
+        raise ValidationError(sorted(set(errors)))
+
+    results = []
+    flights = set()
+    for (ac_id, event_id), value in values.items():
+        result = Result(athlete_competition_id=ac_id, event_id=event_id, value=value)
+        result.parse_value(events[event_id].weight_type)
+        results.append(result)
+        flights.add((event_id, flight_key(athlete_competitions[ac_id])))
+
+    touched_flights = {flight for _, flight in flights}
+    flight_members = defaultdict(list)
+    for ac_id, gender, division_id, weight_class_id in (
+        AthleteCompetition.objects
+        .filter(competition=competition)
+        .filter(reduce(or_, (Q(**_flight_filter(flight)) for flight in touched_flights)))
+        .values_list('pk', 'athlete__gender', 'division_id', 'weight_class_id')
+    ):
+        flight_members[(gender, division_id, weight_class_id)].append(ac_id)
+    placeholders = [
+        Result(athlete_competition_id=ac_id, event_id=event_id, value='')
+        for event_id, flight in flights
+        for ac_id in flight_members[flight]
+        if (ac_id, event_id) not in values
+    ]
+
+    with transaction.atomic():
+        Result.objects.bulk_create(placeholders, ignore_conflicts=True)
+        Result.objects.bulk_create(
+            results,
+            update_conflicts=True,
+            unique_fields=['athlete_competition', 'event'],
+            update_fields=['value', *Result.PARSED_FIELDS],
+        )
+        delta_results = []
+        for event_id, flight in flights:
+            flight_results, changed = _rescore_flight(events[event_id], flight)
+            submitted = {ac_id for ac_id, scored_event_id in values if scored_event_id == event_id}
+            delta_results.extend(_delta_results(flight_results, changed, submitted))
+        standings = _write_standings(standings_queryset(competition.pk, touched_flights), competition.pk)
+        publish_delta(competition.pk, delta_results, standings, {event_id for event_id, _ in flights})
+
+    return results
@@ -30,6 +30,16 @@ class ResultSerializer(serializers.ModelSerializer):
         model = Result
         fields = ['event', 'points_earned', 'event_rank', 'time', 'value']
 
+class ScoreEntrySerializer(serializers.Serializer):
+    athlete_competition = serializers.IntegerField()
+    event = serializers.IntegerField()
+    value = serializers.CharField(max_length=255, allow_blank=True)
+
+class ScoredResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Result
+        fields = ['athlete_competition', 'event', 'value', 'points_earned', 'event_rank']
+
 class AthleteProfileSerializer(serializers.ModelSerializer):
     # Pull first_name, last_name, and profile_picture from User model
     first_name = serializers.CharField(source='user.first_name')
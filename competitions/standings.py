@@ -0,0 +1,139 @@
+"""
+Live standings snapshots.
+
+The public scorecard and broadcast pages render the whole competition on every
+request. Instead of rebuilding it each time, a per-competition snapshot of
+plain, JSON-friendly data is kept in the cache and rebuilt when the scoring
+engine commits a change.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from competitions.models import AthleteCompetition, Competition, Result
+
+# Scores refresh the snapshot as soon as they commit; the timeout only bounds
+# how long other edits (registrations, events) take to show up.
+STANDINGS_CACHE_TIMEOUT = 60 * 5
+
+
+def standings_cache_key(competition_id):
+    return f'competition:{competition_id}:standings'
+
+
+def weight_class_display(weight_class):
+    if weight_class and weight_class.weight_d == 'u':
+        return f"{weight_class.weight_d}{weight_class.name}"
+    elif weight_class and weight_class.weight_d == '+':
+        return f"{weight_class.name}{weight_class.weight_d}"
+    return str(weight_class.name) if weight_class else "N/A"
+
+
+def division_display(division):
+    return division.name.capitalize() if division else "N/A"
+
+
+def build_standings(competition):
+    """
+    Builds the standings snapshot for a competition.
+
+    Athletes are grouped by division, gender and weight class in overall rank
+    order, and each athlete's ``results`` list lines up with ``events``.
+    ``version`` is the live feed version read before the build, so replaying
+    later deltas on top of it never skips a change.
+    """
+    from competitions.live import current_version
+
+    version = current_version(competition.pk)
+    events = [
+        {
+            'id': event.pk,
+            'name': event.name,
+            'description': event.description or '',
+            'weight_type': event.weight_type,
+            'weight_type_display': event.get_weight_type_display(),
+        }
+        for event in competition.events.order_by('order')
+    ]
+
+    results = {}
+    for result in Result.objects.filter(athlete_competition__competition=competition).order_by().values(
+        'athlete_competition_id', 'event_id', 'value', 'event_rank', 'points_earned'
+    ):
+        results[(result['athlete_competition_id'], result['event_id'])] = result
+
+    groups = {}
+    athlete_competitions = (
+        AthleteCompetition.objects
+        .filter(competition=competition)
+        .select_related('athlete__user', 'division', 'weight_class')
+        .order_by('rank')
+    )
+    for ac in athlete_competitions:
+        group = groups.setdefault((ac.division_id, ac.athlete.gender, ac.weight_class_id), {
+            'division': division_display(ac.division),
+            'gender': ac.athlete.gender,
+            'weight_class': weight_class_display(ac.weight_class),
+            'division_id': ac.division_id,
+            'weight_class_id': ac.weight_class_id,
+            'athletes': [],
+        })
+        athlete_results = []
+        for event in events:
+            result = results.get((ac.pk, event['id']), {})
+            points = result.get('points_earned')
+            athlete_results.append({
+                'event_id': event['id'],
+                'value': result.get('value', ''),
+                'event_rank': result.get('event_rank'),
+                'points_earned': float(points) if points is not None else None,
+            })
+        user = ac.athlete.user
+        group['athletes'].append({
+            'id': ac.pk,
+            'user_id': user.pk,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'full_name': user.get_full_name(),
+            'rank': ac.rank,
+            'total_points': ac.total_points,
+            'results': athlete_results,
+        })
+
+    return {
+        'competition_id': competition.pk,
+        'version': version,
+        'events': events,
+        'groups': list(groups.values()),
+        'built_at': timezone.now().isoformat(),
+    }
+
+
+def get_standings(competition):
+    """
+    Returns the cached standings snapshot, building it on a cache miss.
+    """
+    snapshot = cache.get(standings_cache_key(competition.pk))
+    if snapshot is None:
+        snapshot = build_standings(competition)
+        cache.set(standings_cache_key(competition.pk), snapshot, STANDINGS_CACHE_TIMEOUT)
+    return snapshot
+
+
+def refresh_standings(competition_id):
+    """
+    Rebuilds and stores the snapshot. Called once scoring changes are committed.
+    """
+    competition = Competition.objects.filter(pk=competition_id).first()
+    if competition is None:
+        cache.delete(standings_cache_key(competition_id))
+        return None
+    snapshot = build_standings(competition)
+    cache.set(standings_cache_key(competition_id), snapshot, STANDINGS_CACHE_TIMEOUT)
+    return snapshot
+
+
+def find_group(snapshot, division_id, gender, weight_class_id):
+    for group in snapshot['groups']:
+        if (group['division_id'], group['gender'], group['weight_class_id']) == (division_id, gender, weight_class_id):
+            return group
+    return None
@@ -1,3 +1,1027 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.core.exceptions import ValidationError
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.cache import get_max_age
+from django.utils import timezone
+
+from accounts.models import AthleteProfile, User
+from competitions.attempts import record_attempt, request_attempt
+from competitions.consumers import ScoreUpdateConsumer
+from competitions.live import catch_up, current_version, delta_cache_key, flush_deltas, publish_delta, queue_delta, \
+    run_order_version, send_delta
+from competitions.models import Attempt, AthleteCompetition, AthleteEventNote, Competition, CompetitionRunOrder, \
+    Division, Event, Federation, LaneAssignment, Result, WeightClass
+from competitions.routing import websocket_urlpatterns
+from competitions.run_order import balance_lanes, generate_run_order, get_run_order_board, sync_run_order_lanes
+from competitions.scoring import _best_first, rank_event_results, recalculate_for_result, standings_queryset, \
+    submit_scores
+from competitions.timing import TIMING_WINDOW, predict_event, record_lift
+from competitions.utils import PRESIGNED_URL_MARGIN, cached_presigned_url
+from competitions.views.competition_api import BROADCAST_STREAM_SECTIONS, _format_eta, _leaderboard_rows, \
+    broadcast_stream
+from competitions.vmix import feed_version, touch_feeds
+
+# Scoring publishes to the live feed and caches snapshots; keep both in memory.
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    'LIVE_SCORE_COALESCE_WINDOW': 0,
+}
+
+
+def make_competition(name='Test Open'):
+    organizer = User.objects.create(username=f'{name}-organizer')
+    federation = Federation.objects.create(name=f'{name} federation')
+    competition = Competition.objects.create(
+        name=name,
+        comp_date=datetime.date.today(),
+        organizer=organizer,
+        registration_deadline=timezone.now(),
+        status='upcoming',
+    )
+    division = Division.objects.create(predefined_name='open')
+    weight_class = WeightClass.objects.create(
+        name=90, gender='Male', federation=federation, weight_d='u', division=division, competition=competition
+    )
+    return competition, division, weight_class
+
+
+def make_athletes(competition, division, weight_class, count, gender='male'):
+    athletes = []
+    for i in range(count):
+        user = User.objects.create(
+            username=f'{competition.name}-{gender}-{i}', first_name=f'First{i}', last_name=f'Last{i}'
+        )
+        profile = AthleteProfile.objects.create(user=user, gender=gender)
+        athletes.append(AthleteCompetition.objects.create(
+            athlete=profile, competition=competition, division=division, weight_class=weight_class,
+            payment_status='paid',
+        ))
+    return athletes
+
+
+def rank(event, athletes, values):
+    """
+    Scores one flight of an event and returns each athlete's (event_rank, points_earned).
+    """
+    for athlete, value in zip(athletes, values):
+        Result.objects.create(athlete_competition=athlete, event=event, value=value)
+    results = Result.objects.filter(event=event, athlete_competition__in=athletes)
+    Result.objects.bulk_update(rank_event_results(_best_first(results)), ['points_earned', 'event_rank'])
+    return {result.athlete_competition_id: (result.event_rank, result.points_earned) for result in results}
+
+
+@override_settings(**TEST_SETTINGS)
+class RankEventResultsTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 4)
+
+    def make_event(self, weight_type):
+        return Event.objects.create(name=weight_type, competition=self.competition, order=1, weight_type=weight_type)
+
+    def test_equal_values_in_different_formats_share_averaged_points(self):
+        a, b, c, d = self.athletes
+        ranks = rank(self.make_event('reps'), self.athletes, ['10', '10.0', '8', ''])
+
+        self.assertEqual(ranks[a.pk], (1, 3.5))
+        self.assertEqual(ranks[b.pk], (1, 3.5))
+        self.assertEqual(ranks[c.pk], (3, 2))
+        # No score earns nothing and ranks last
+        self.assertEqual(ranks[d.pk], (4, 0))
+
+    def test_max_event_ranks_higher_values_first(self):
+        a, b, c, d = self.athletes
+        ranks = rank(self.make_event('max'), self.athletes, ['200', '250.5', '180', '250.50'])
+
+        self.assertEqual(ranks[b.pk], (1, 3.5))
+        self.assertEqual(ranks[d.pk], (1, 3.5))
+        self.assertEqual(ranks[a.pk], (3, 2))
+        self.assertEqual(ranks[c.pk], (4, 1))
+
+    def test_time_event_ranks_faster_times_first(self):
+        a, b, c, d = self.athletes
+        # More implements beat fewer; with the same implements, less time wins
+        ranks = rank(self.make_event('time'), self.athletes, ['5+00:45', '5+0:30', '4+00:20', '5+00:30.0'])
+
+        self.assertEqual(ranks[b.pk], (1, 3.5))
+        self.assertEqual(ranks[d.pk], (1, 3.5))
+        self.assertEqual(ranks[a.pk], (3, 2))
+        self.assertEqual(ranks[c.pk], (4, 1))
+
+
+@override_settings(**TEST_SETTINGS)
+class StandingsQuerysetTests(TestCase):
+    def test_equal_totals_share_a_rank_and_skip_the_next(self):
+        competition, division, weight_class = make_competition()
+        athletes = make_athletes(competition, division, weight_class, 4)
+        first = Event.objects.create(name='Log', competition=competition, order=1, weight_type='reps')
+        second = Event.objects.create(name='Deadlift', competition=competition, order=2, weight_type='reps')
+        # Totals: 6, 6, 4 and 4 points, so ranks 1, 1, 3, 3
+        rank(first, athletes, ['10', '8', '9', '7'])
+        rank(second, athletes, ['7', '9', '6', '8'])
+
+        standings = {ac.pk: ac.standing for ac in standings_queryset(competition.pk)}
+
+        self.assertEqual([standings[ac.pk] for ac in athletes], [1, 1, 3, 3])
+
+    def test_flights_are_ranked_separately(self):
+        competition, division, weight_class = make_competition()
+        men = make_athletes(competition, division, weight_class, 2, gender='male')
+        women = make_athletes(competition, division, weight_class, 2, gender='female')
+        event = Event.objects.create(name='Log', competition=competition, order=1, weight_type='reps')
+        rank(event, men, ['10', '8'])
+        rank(event, women, ['6', '9'])
+
+        standings = {ac.pk: ac.standing for ac in standings_queryset(competition.pk)}
+
+        self.assertEqual([standings[ac.pk] for ac in men + women], [1, 2, 2, 1])
+
+
+@override_settings(**TEST_SETTINGS)
+class SubmitScoresTests(TestCase):
+    def setUp(self):
+        self.competition, self.division, self.weight_class = make_competition()
+        self.event = Event.objects.create(name='Log', competition=self.competition, order=1, weight_type='reps')
+
+    def points(self, athletes):
+        results = {result.athlete_competition_id: result for result in Result.objects.filter(event=self.event)}
+        return [(results[ac.pk].event_rank, results[ac.pk].points_earned) for ac in athletes]
+
+    def test_points_match_the_single_result_path(self):
+        values = ['10', '12', '10.0', '7', '']
+        batch = make_athletes(self.competition, self.division, self.weight_class, 5, gender='male')
+        single = make_athletes(self.competition, self.division, self.weight_class, 5, gender='female')
+
+        submit_scores(self.competition, [(ac.pk, self.event.pk, value) for ac, value in zip(batch, values)])
+        for ac, value in zip(single, values):
+            recalculate_for_result(Result.objects.create(athlete_competition=ac, event=self.event, value=value))
+
+        self.assertEqual(self.points(batch), self.points(single))
+        total = AthleteCompetition.objects.in_bulk([ac.pk for ac in batch + single])
+        self.assertEqual(
+            [(total[ac.pk].total_points, total[ac.pk].rank) for ac in batch],
+            [(total[ac.pk].total_points, total[ac.pk].rank) for ac in single],
+        )
+
+    def test_flight_mates_without_a_score_get_a_placeholder(self):
+        athletes = make_athletes(self.competition, self.division, self.weight_class, 4)
+
+        submit_scores(self.competition, [(athletes[0].pk, self.event.pk, '10')])
+
+        # The lone score is ranked against the whole flight
+        self.assertEqual(self.points(athletes), [(1, 4), (4, 0), (4, 0), (4, 0)])
+
+    def test_changing_the_weight_type_re_ranks_existing_results(self):
+        athletes = make_athletes(self.competition, self.division, self.weight_class, 2)
+        values = ['5+00:45', '5+00:30']
+        submit_scores(self.competition, [(ac.pk, self.event.pk, value) for ac, value in zip(athletes, values)])
+
+        self.event.weight_type = 'time'
+        self.event.save()
+
+        self.assertEqual(self.points(athletes), [(2, 1), (1, 2)])
+        self.assertIsNotNone(Result.objects.get(event=self.event, athlete_competition=athletes[0]).sort_key)
+
+    def test_snapshot_failure_after_commit_is_not_raised(self):
+        athlete, = make_athletes(self.competition, self.division, self.weight_class, 1)
+
+        with mock.patch('competitions.scoring.refresh_standings', side_effect=ConnectionError), \
+                self.captureOnCommitCallbacks(execute=True):
+            submit_scores(self.competition, [(athlete.pk, self.event.pk, '10')])
+
+        self.assertEqual(self.points([athlete]), [(1, 1)])
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def count_queries(athletes):
+            entries = [(ac.pk, self.event.pk, str(10 + i)) for i, ac in enumerate(athletes)]
+            with CaptureQueriesContext(connection) as queries:
+                submit_scores(self.competition, entries)
+            return len(queries)
+
+        small = make_athletes(self.competition, self.division, self.weight_class, 3, gender='male')
+        large = make_athletes(self.competition, self.division, self.weight_class, 30, gender='female')
+
+        self.assertEqual(count_queries(small), count_queries(large))
+
+
+@override_settings(**TEST_SETTINGS)
+class EventScoresViewTests(TestCase):
+    def setUp(self):
+        self.competition, self.division, self.weight_class = make_competition()
+        self.event = Event.objects.create(name='Log', competition=self.competition, order=1, weight_type='reps')
+        self.client.force_login(self.competition.organizer)
+        self.url = reverse('competitions:event_scores', args=[self.competition.pk, self.event.pk])
+
+    def add_athletes(self, count, gender):
+        athletes = make_athletes(self.competition, self.division, self.weight_class, count, gender=gender)
+        # Half are scored, so the page shows saved results and placeholders alike
+        submit_scores(self.competition, [(ac.pk, self.event.pk, str(10 + i)) for i, ac in enumerate(athletes[::2])])
+
+    def test_query_count_does_not_grow_with_the_athletes(self):
+        self.add_athletes(2, 'male')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url, secure=True).status_code, 200)
+
+        self.add_athletes(6, 'female')
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.url, secure=True)
+
+        self.assertEqual(len(response.context['grouped_athletes']['female']['open']), 6)
+
+
+@override_settings(**TEST_SETTINGS)
+class MaxAttemptConsoleTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(name='Axle', competition=self.competition, order=1, weight_type='max')
+        generate_run_order(self.competition, self.event)
+        self.client.force_login(self.competition.organizer)
+        self.url = reverse('competitions:competition_run_order', args=[self.competition.pk, self.event.pk])
+
+    def post(self, **data):
+        response = self.client.post(self.url, data, secure=True)
+        self.assertEqual(response.status_code, 302)
+        return response
+
+    def test_rejected_next_attempt_is_not_noted(self):
+        athlete = self.athletes[0]
+        request_attempt(athlete, self.event, 100)
+        record_attempt(athlete, self.event, made=True)
+        request_attempt(athlete, self.event, 120)
+
+        self.post(action='save_event_note', athlete_competition_id=athlete.pk, note_type='next_attempt', note_value='90')
+
+        self.assertFalse(AthleteEventNote.objects.filter(athlete_competition=athlete, note_type='next_attempt').exists())
+        self.assertEqual(Attempt.objects.get(athlete_competition=athlete, outcome='pending').weight, 120)
+
+    def test_judged_weight_may_not_drop_below_the_last_attempt(self):
+        athlete = self.athletes[0]
+        request_attempt(athlete, self.event, 100)
+        record_attempt(athlete, self.event, made=True)
+        request_attempt(athlete, self.event, 120)
+
+        with self.assertRaises(ValidationError):
+            record_attempt(athlete, self.event, made=True, weight=90)
+        self.assertEqual(Attempt.objects.get(athlete_competition=athlete, outcome='pending').weight, 120)
+
+    def test_lifter_without_a_requested_attempt_advances(self):
+        current = CompetitionRunOrder.objects.get(event=self.event, status='current')
+
+        self.post(action='complete_current_lifter', run_order_id=current.pk, attempt_result='made')
+
+        current.refresh_from_db()
+        self.assertEqual(current.status, 'completed')
+        self.assertFalse(Attempt.objects.filter(event=self.event).exists())
+
+    def test_lightest_requested_attempt_is_promoted_next(self):
+        first, heavy, light = self.athletes
+        request_attempt(heavy, self.event, 120)
+        request_attempt(light, self.event, 100)
+        current = CompetitionRunOrder.objects.get(event=self.event, status='current')
+        self.assertEqual(current.athlete_competition, first)
+
+        self.post(action='complete_current_lifter', run_order_id=current.pk, attempt_result='made')
+
+        self.assertEqual(CompetitionRunOrder.objects.get(event=self.event, status='current').athlete_competition, light)
+
+
+@override_settings(**TEST_SETTINGS)
+class RunOrderStrategyTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(
+            name='Axle', competition=self.competition, order=1, weight_type='max', number_of_lanes=2
+        )
+
+    def slots(self, run_orders):
+        return [(ro.athlete_competition_id, ro.lane_number, ro.heat_number) for ro in run_orders]
+
+    def test_reverse_standings_puts_the_leader_last(self):
+        a, b, c = self.athletes
+        AthleteCompetition.objects.filter(pk=a.pk).update(rank=1)
+        AthleteCompetition.objects.filter(pk=b.pk).update(rank=2)
+
+        run_orders = generate_run_order(self.competition, self.event, 'reverse_standings')
+
+        # Unranked athletes go first
+        self.assertEqual([ro.athlete_competition_id for ro in run_orders], [c.pk, b.pk, a.pk])
+
+    def test_heat_balanced_fills_every_lane_and_saves_the_plan(self):
+        a, b, c = self.athletes
+
+        run_orders = generate_run_order(self.competition, self.event, 'heat_balanced')
+
+        self.assertEqual(self.slots(run_orders), [(a.pk, 1, 1), (b.pk, 2, 1), (c.pk, 1, 2)])
+        self.assertEqual(
+            set(LaneAssignment.objects.filter(event=self.event)
+                .values_list('athlete_competition_id', 'lane_number', 'heat_number')),
+            {(a.pk, 1, 1), (b.pk, 2, 1), (c.pk, 1, 2)},
+        )
+
+    def test_last_man_standing_keeps_lanes_and_athletes_without_a_request(self):
+        a, b, c = self.athletes
+        LaneAssignment.objects.create(athlete_competition=a, event=self.event, lane_number=2, heat_number=1)
+        LaneAssignment.objects.create(athlete_competition=c, event=self.event, lane_number=1, heat_number=2)
+        request_attempt(a, self.event, 150)
+        request_attempt(c, self.event, 120)
+
+        run_orders = generate_run_order(self.competition, self.event, 'last_man_standing')
+
+        self.assertEqual(self.slots(run_orders), [(c.pk, 1, 2), (a.pk, 2, 1), (b.pk, 1, 1)])
+        self.assertEqual(
+            set(LaneAssignment.objects.filter(event=self.event).values_list('athlete_competition_id', 'lane_number')),
+            {(a.pk, 2), (c.pk, 1)},
+        )
+
+    def test_last_man_standing_follows_requests_with_the_rest_in_division_order(self):
+        a, b, c = self.athletes
+        division, weight_class = a.division, a.weight_class
+        women = make_athletes(self.competition, division, weight_class, 2, gender='female')
+        request_attempt(c, self.event, 120)
+        AthleteEventNote.objects.create(
+            athlete_competition=a, event=self.event, note_type='opening_weight', note_value='100'
+        )
+
+        run_orders = generate_run_order(self.competition, self.event, 'last_man_standing')
+
+        # Athletes yet to ask for a weight stay on the console, flight by flight, to be called later
+        self.assertEqual(
+            [ro.athlete_competition_id for ro in run_orders],
+            [a.pk, c.pk, women[0].pk, women[1].pk, b.pk],
+        )
+
+
+@override_settings(**TEST_SETTINGS)
+class RunOrderReorderTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(name='Yoke', competition=self.competition, order=1, weight_type='time')
+        for ac, heat in zip(self.athletes, [1, 1, 2]):
+            LaneAssignment.objects.create(athlete_competition=ac, event=self.event, lane_number=1, heat_number=heat)
+        self.run_orders = generate_run_order(self.competition, self.event)
+        self.client.force_login(self.competition.organizer)
+        self.url = reverse('competitions:run_order_reorder', args=[self.competition.pk, self.event.pk])
+
+    def reorder(self, lanes, partial=False):
+        return self.client.post(
+            self.url, json.dumps({'lanes': lanes, 'partial': partial}), content_type='application/json', secure=True
+        )
+
+    def test_row_dropped_into_another_heat_joins_it(self):
+        a, b, c = self.run_orders
+
+        response = self.reorder({'1': [a.pk, c.pk, b.pk]})
+
+        self.assertEqual(response.status_code, 200)
+        slots = {ro.pk: (ro.heat_number, ro.order) for ro in CompetitionRunOrder.objects.filter(event=self.event)}
+        self.assertEqual(slots, {a.pk: (1, 1), c.pk: (1, 2), b.pk: (2, 3)})
+        self.assertEqual(
+            LaneAssignment.objects.get(event=self.event, athlete_competition=b.athlete_competition).heat_number, 2
+        )
+
+    def test_manual_edit_retires_the_board_and_feed_once(self):
+        a, b, c = self.run_orders
+        url = reverse('competitions:manual_run_order_edit', args=[self.competition.pk, self.event.pk])
+        versions = run_order_version(self.event.pk), feed_version(self.competition.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {f'order_ro_{a.pk}': 2, f'order_ro_{b.pk}': 1}, secure=True)
+
+        self.assertEqual(
+            (run_order_version(self.event.pk), feed_version(self.competition.pk)),
+            (versions[0] + 1, versions[1] + 1),
+        )
+
+    def test_row_from_another_lane_is_rejected(self):
+        a, b, c = self.run_orders
+
+        response = self.reorder({'2': [a.pk]}, partial=True)
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(**TEST_SETTINGS)
+class LeaderboardRowsTests(TestCase):
+    def test_list_size_applies_to_each_gender_of_a_class(self):
+        competition, division, weight_class = make_competition()
+        men = make_athletes(competition, division, weight_class, 3, gender='male')
+        women = make_athletes(competition, division, weight_class, 3, gender='female')
+        event = Event.objects.create(name='Log', competition=competition, order=1, weight_type='reps')
+        submit_scores(competition, [(ac.pk, event.pk, str(10 - i)) for i, ac in enumerate(men + women)])
+
+        rows = _leaderboard_rows(competition.pk, [weight_class.pk], [], 2)
+
+        leaders = [ac.athlete.user.get_full_name().upper() for ac in men[:2] + women[:2]]
+        self.assertCountEqual([row['athleteName'] for row in rows], leaders)
+        self.assertEqual(sorted(row['position'] for row in rows), [1, 1, 2, 2])
+
+
+@override_settings(**TEST_SETTINGS)
+class LiveDeltaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 2)
+
+    def test_each_delta_gets_the_next_version(self):
+        first = send_delta(self.competition.pk, {'type': 'delta', 'results': [], 'standings': []})
+        second = send_delta(self.competition.pk, {'type': 'delta', 'results': [], 'standings': []})
+
+        self.assertEqual((first['version'], second['version']), (1, 2))
+        self.assertEqual(current_version(self.competition.pk), 2)
+
+    def test_catch_up_sends_missed_deltas_in_order(self):
+        for _ in range(3):
+            send_delta(self.competition.pk, {'type': 'delta', 'results': [], 'standings': []})
+
+        self.assertEqual([message['version'] for message in catch_up(self.competition.pk, 1)], [2, 3])
+        self.assertEqual(catch_up(self.competition.pk, 3), [])
+
+    def test_catch_up_falls_back_to_a_snapshot_when_a_delta_is_gone(self):
+        for _ in range(3):
+            send_delta(self.competition.pk, {'type': 'delta', 'results': [], 'standings': []})
+        cache.delete(delta_cache_key(self.competition.pk, 2))
+
+        messages = catch_up(self.competition.pk, 1)
+
+        self.assertEqual([message['type'] for message in messages], ['snapshot'])
+
+    def test_delta_is_only_sent_once_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            publish_delta(self.competition.pk, standings=self.athletes)
+        self.assertEqual(current_version(self.competition.pk), 0)
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(current_version(self.competition.pk), 1)
+
+    @override_settings(LIVE_SCORE_COALESCE_WINDOW=60)
+    def test_deltas_in_one_window_are_merged(self):
+        a, b = self.athletes
+        queue_delta(self.competition.pk, {'results': [{'athlete_id': a.pk, 'event_id': 1, 'value': '10'}],
+                                          'standings': []})
+        queue_delta(self.competition.pk, {'results': [{'athlete_id': a.pk, 'event_id': 1, 'value': '12'},
+                                                      {'athlete_id': b.pk, 'event_id': 1, 'value': '8'}],
+                                          'standings': []})
+
+        # Windows are flushed on a timer thread, which closes its own connections
+        flushed = []
+        flusher = threading.Thread(target=lambda: flushed.append(flush_deltas(self.competition.pk)))
+        flusher.start()
+        flusher.join()
+        message, = flushed
+
+        self.assertEqual(current_version(self.competition.pk), 1)
+        self.assertEqual(
+            {(result['athlete_id'], result['value']) for result in message['results']}, {(a.pk, '12'), (b.pk, '8')}
+        )
+
+
+# The consumer's database calls close the connection, so each test commits its data.
+@override_settings(**TEST_SETTINGS)
+class ScoreUpdateConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition = make_competition()[0]
+
+    def communicator(self, query=''):
+        path = f'/ws/competitions/{self.competition.pk}/{query}'
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+
+    async def test_reconnecting_client_is_sent_what_it_missed(self):
+        for _ in range(2):
+            await sync_to_async(send_delta)(self.competition.pk, {'type': 'delta', 'results': [], 'standings': []})
+        communicator = self.communicator('?since=1')
+        connected, _ = await communicator.connect()
+
+        message = await communicator.receive_json_from()
+
+        self.assertTrue(connected)
+        self.assertEqual(message['message']['version'], 2)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_client_that_keeps_sending_is_disconnected(self):
+        communicator = self.communicator()
+        await communicator.connect()
+
+        for _ in range(ScoreUpdateConsumer.inbound_limit + 1):
+            await communicator.send_to(text_data='{}')
+
+        output = await communicator.receive_output()
+        self.assertEqual(output, {'type': 'websocket.close', 'code': ScoreUpdateConsumer.rate_limited_close_code})
+        await communicator.disconnect()
+
+    def test_full_outbox_is_replaced_by_one_snapshot_request(self):
+        consumer = ScoreUpdateConsumer()
+        consumer.outbox = asyncio.Queue(maxsize=2)
+        consumer.resync = False
+
+        for version in range(1, 5):
+            consumer.enqueue({'version': version})
+
+        self.assertTrue(consumer.resync)
+        self.assertEqual(consumer.outbox.qsize(), 1)
+        self.assertIsNone(consumer.outbox.get_nowait()[1])
+
+
+@override_settings(**TEST_SETTINGS)
+class RunOrderLaneSyncTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(
+            name='Yoke', competition=self.competition, order=1, weight_type='time', number_of_lanes=2
+        )
+
+    def slots(self):
+        return {
+            ro.athlete_competition_id: (ro.lane_number, ro.heat_number)
+            for ro in CompetitionRunOrder.objects.filter(event=self.event)
+        }
+
+    def test_run_order_copies_lane_assignments(self):
+        a, b, c = self.athletes
+        LaneAssignment.objects.create(athlete_competition=b, event=self.event, lane_number=2, heat_number=3)
+
+        generate_run_order(self.competition, self.event)
+
+        self.assertEqual(self.slots(), {a.pk: (1, 1), b.pk: (2, 3), c.pk: (1, 1)})
+
+    def test_sync_follows_changed_and_removed_assignments(self):
+        a, b, c = self.athletes
+        LaneAssignment.objects.create(athlete_competition=a, event=self.event, lane_number=2, heat_number=2)
+        LaneAssignment.objects.create(athlete_competition=b, event=self.event, lane_number=2, heat_number=1)
+        generate_run_order(self.competition, self.event)
+        LaneAssignment.objects.filter(athlete_competition=a).update(lane_number=1, heat_number=4)
+        LaneAssignment.objects.filter(athlete_competition=b).delete()
+
+        sync_run_order_lanes(self.event)
+
+        self.assertEqual(self.slots(), {a.pk: (1, 4), b.pk: (1, 1), c.pk: (1, 1)})
+
+    def test_sync_can_be_limited_to_some_athletes(self):
+        a, b, c = self.athletes
+        generate_run_order(self.competition, self.event)
+        LaneAssignment.objects.create(athlete_competition=a, event=self.event, lane_number=2, heat_number=1)
+        LaneAssignment.objects.create(athlete_competition=b, event=self.event, lane_number=2, heat_number=1)
+
+        self.assertEqual(sync_run_order_lanes(self.event, [a.pk]), 1)
+        self.assertEqual(self.slots(), {a.pk: (2, 1), b.pk: (1, 1), c.pk: (1, 1)})
+
+
+@override_settings(**TEST_SETTINGS)
+class EventTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.now()
+
+    def lift(self, seconds, lane=1):
+        return record_lift(1, lane, self.start, self.start + datetime.timedelta(seconds=seconds))
+
+    def test_average_is_a_plain_mean_until_the_window_fills(self):
+        self.lift(60)
+
+        self.assertEqual(self.lift(120), {'count': 2, 'average_seconds': 90})
+
+    def test_average_moves_by_a_window_share_once_full(self):
+        for _ in range(TIMING_WINDOW):
+            self.lift(60)
+
+        timing = self.lift(60 + 10 * TIMING_WINDOW)
+
+        self.assertEqual(timing['count'], TIMING_WINDOW + 1)
+        self.assertAlmostEqual(timing['average_seconds'], 70)
+
+    def test_lifts_without_a_usable_duration_are_ignored(self):
+        self.assertIsNone(self.lift(0))
+        self.assertIsNone(self.lift(60 * 60))
+        self.assertIsNone(record_lift(1, 1, None, self.start))
+
+    def test_waiting_athletes_are_spaced_by_their_lane_average(self):
+        competition, division, weight_class = make_competition()
+        make_athletes(competition, division, weight_class, 3)
+        event = Event.objects.create(name='Yoke', competition=competition, order=1, weight_type='time')
+        current, first, second = generate_run_order(competition, event)
+        for _ in range(2):
+            record_lift(event.pk, 1, self.start, self.start + datetime.timedelta(seconds=60))
+
+        eta = predict_event(event, now=current.started_at + datetime.timedelta(seconds=30))
+
+        step = datetime.timedelta(seconds=60)
+        self.assertEqual(
+            [athlete['expected_start'] for athlete in eta['lanes'][1]['athletes']],
+            [current.started_at + step, current.started_at + 2 * step],
+        )
+        self.assertEqual(eta['finishes_at'], current.started_at + 3 * step)
+
+
+@override_settings(**TEST_SETTINGS)
+class VmixFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, self.weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, self.weight_class, 2)
+        self.event = Event.objects.create(name='Log', competition=self.competition, order=1, weight_type='reps')
+        self.params = {'competitionID': self.competition.pk, 'weightClassID': self.weight_class.pk}
+
+    def get(self, **headers):
+        return self.client.get(reverse('api_leaderboard'), self.params, headers=headers, secure=True)
+
+    def test_matching_etag_gets_an_empty_304(self):
+        etag = self.get()['ETag']
+
+        response = self.get(if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def test_unchanged_feed_is_served_from_the_cache(self):
+        self.get()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_score_change_serves_a_new_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_scores(self.competition, [(self.athletes[1].pk, self.event.pk, '10')])
+
+        response = self.get(if_none_match=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_version_with_the_same_data_keeps_the_etag(self):
+        etag = self.get()['ETag']
+        touch_feeds([self.competition.pk])
+
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+    def start_event(self, started_at):
+        run_orders = generate_run_order(self.competition, self.event)
+        CompetitionRunOrder.objects.filter(pk=run_orders[0].pk).update(status='current', started_at=started_at)
+        self.competition.current_event = self.event
+        self.competition.save(update_fields=['current_event'])
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_image_urls_follow_the_requested_host(self):
+        self.start_event(timezone.now())
+        url = reverse('api_current_competitors')
+
+        for host in ['a.example.com', 'b.example.com']:
+            image_url = self.client.get(url, self.params, headers={'host': host}, secure=True).json()[0]['imageUrl']
+            self.assertTrue(image_url.startswith(f'https://{host}/'))
+
+    def test_etas_are_reckoned_from_the_version_change(self):
+        touched_at = timezone.now() - datetime.timedelta(hours=3)
+        # The current lifter is overdue, so the next one is expected at once
+        self.start_event(touched_at - datetime.timedelta(hours=1))
+        with mock.patch('competitions.vmix.timezone.now', return_value=touched_at):
+            touch_feeds([self.competition.pk])
+
+        response = self.client.get(reverse('api_up_next_competitors'), self.params, secure=True)
+
+        self.assertEqual(response.json()[0]['eta'], _format_eta(touched_at))
+
+
+@override_settings(**TEST_SETTINGS)
+class BroadcastStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(name='Yoke', competition=self.competition, order=1, weight_type='time')
+        generate_run_order(self.competition, self.event)
+        self.competition.current_event = self.event
+        self.competition.save(update_fields=['current_event'])
+        self.run_orders = list(CompetitionRunOrder.objects.filter(event=self.event).order_by('order'))
+        self.set_status(self.run_orders[0], 'current')
+
+    def set_status(self, run_order, status):
+        run_order.status = status
+        run_order.save(update_fields=['status'])
+
+    def get_state(self):
+        response = self.client.get(reverse('api_broadcast_state'), {'competitionID': self.competition.pk})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def name(self, run_order):
+        return run_order.athlete_competition.athlete.user.get_full_name().upper()
+
+    def test_version_matches_the_feed_version(self):
+        self.assertEqual(self.get_state()['version'], feed_version(self.competition.pk))
+
+    def test_every_section_reflects_the_same_delta(self):
+        first, second, third = self.run_orders
+        before = self.get_state()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_scores(self.competition, [(first.athlete_competition_id, self.event.pk, '1+00:45')])
+            self.set_status(first, 'completed')
+            self.set_status(second, 'current')
+
+        state = self.get_state()
+        self.assertEqual(state['version'], feed_version(self.competition.pk))
+        self.assertGreater(state['version'], before['version'])
+        self.assertEqual([c['name'] for c in state['currentCompetitors']], [self.name(second)])
+        self.assertEqual([c['name'] for c in state['upNextCompetitors']], [self.name(third)])
+        self.assertEqual(state['currentEvent']['event_name'], self.event.name)
+        leader = state['leaderboard'][0]
+        self.assertEqual((leader['athleteName'], leader['rank']), (self.name(first), 1))
+        self.assertGreater(leader['points'], 0)
+
+
+@override_settings(**TEST_SETTINGS)
+class BroadcastStreamTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, weight_class = make_competition()
+        make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(name='Yoke', competition=self.competition, order=1, weight_type='time')
+        generate_run_order(self.competition, self.event)
+        self.competition.current_event = self.event
+        self.competition.save(update_fields=['current_event'])
+        self.run_orders = list(CompetitionRunOrder.objects.filter(event=self.event).order_by('order'))
+        self.run_orders[0].status = 'current'
+        self.run_orders[0].save(update_fields=['status'])
+        self.first_name = self.run_orders[0].athlete_competition.athlete.user.get_full_name().upper()
+        self.version = feed_version(self.competition.pk)
+
+    async def open_stream(self):
+        request = AsyncRequestFactory().get('/api/broadcast-stream/', {'competitionID': self.competition.pk})
+        response = await broadcast_stream(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    async def read_messages(self, stream, count):
+        messages = []
+        for _ in range(count):
+            chunk = (await anext(stream)).decode()
+            fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+            messages.append(fields)
+        return messages
+
+    def advance_lifter(self):
+        current, following = self.run_orders[:2]
+        current.status = 'completed'
+        current.save(update_fields=['status'])
+        following.status = 'current'
+        following.save(update_fields=['status'])
+        touch_feeds([self.competition.pk])
+
+    async def test_first_message_carries_every_section(self):
+        stream = await self.open_stream()
+
+        messages = await self.read_messages(stream, len(BROADCAST_STREAM_SECTIONS))
+
+        self.assertEqual([m['event'] for m in messages], [event for event, _ in BROADCAST_STREAM_SECTIONS])
+        self.assertEqual({m['id'] for m in messages}, {str(self.version)})
+        current = json.loads(messages[1]['data'])
+        self.assertEqual([c['name'] for c in current], [self.first_name])
+        await stream.aclose()
+
+    async def test_new_version_sends_only_the_changed_sections(self):
+        stream = await self.open_stream()
+        first = {m['event']: m for m in await self.read_messages(stream, len(BROADCAST_STREAM_SECTIONS))}
+
+        with mock.patch('competitions.views.competition_api.BROADCAST_STREAM_KEEPALIVE', 0.05):
+            await sync_to_async(self.advance_lifter)()
+            changed = []
+            while (chunk := (await anext(stream)).decode()) != ': keep-alive\n\n':
+                changed.append(dict(line.split(': ', 1) for line in chunk.strip().split('\n')))
+
+        self.assertIn('current', [m['event'] for m in changed])
+        self.assertNotIn('leaderboard', [m['event'] for m in changed])
+        for message in changed:
+            self.assertEqual(message['id'], str(self.version + 1))
+            self.assertNotEqual(message['data'], first[message['event']]['data'])
+        await stream.aclose()
+
+    async def test_idle_stream_sends_keep_alives(self):
+        stream = await self.open_stream()
+        await self.read_messages(stream, len(BROADCAST_STREAM_SECTIONS))
+
+        with mock.patch('competitions.views.competition_api.BROADCAST_STREAM_KEEPALIVE', 0.05):
+            chunks = [(await anext(stream)).decode() for _ in range(2)]
+
+        self.assertEqual(chunks, [': keep-alive\n\n'] * 2)
+        await stream.aclose()
+
+
+@override_settings(**TEST_SETTINGS)
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'competitions.utils.generate_presigned_url', side_effect=lambda key, expires_in: f'https://s3/{key}'
+        )
+        self.sign = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='pictured', profile_picture='profile_pics/first.png')
+        self.url = reverse('serve_profile_picture', args=[self.user.pk])
+
+    def test_signed_url_is_reused_until_the_margin(self):
+        with mock.patch('competitions.utils.time.time', return_value=1000):
+            url, max_age = cached_presigned_url('profile_pics/first.png')
+        self.assertEqual(max_age, 3600 - PRESIGNED_URL_MARGIN)
+
+        with mock.patch('competitions.utils.time.time', return_value=2000):
+            self.assertEqual(cached_presigned_url('profile_pics/first.png'), (url, 2600 - PRESIGNED_URL_MARGIN))
+        self.assertEqual(self.sign.call_count, 1)
+
+    def test_redirect_is_only_cached_by_the_client_within_the_url_lifetime(self):
+        response = self.client.get(self.url, secure=True)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'https://s3/profile_pics/first.png')
+        cache_control = {part.strip() for part in response['Cache-Control'].split(',')}
+        self.assertIn('private', cache_control)
+        self.assertNotIn('public', cache_control)
+        self.assertLessEqual(get_max_age(response), 3600 - PRESIGNED_URL_MARGIN)
+
+    def test_changed_picture_redirects_to_the_new_file(self):
+        self.client.get(self.url, secure=True)
+        self.user.profile_picture = 'profile_pics/second.png'
+        self.user.save(update_fields=['profile_picture'])
+
+        response = self.client.get(self.url, secure=True)
+
+        self.assertEqual(response['Location'], 'https://s3/profile_pics/second.png')
+
+
+@override_settings(**TEST_SETTINGS)
+class AdvanceLifterTests(TestCase):
+    def setUp(self):
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 4)
+        self.event = Event.objects.create(
+            name='Yoke', competition=self.competition, order=1, weight_type='time', number_of_lanes=2
+        )
+        for ac, (lane, heat) in zip(self.athletes, [(1, 1), (1, 2), (1, 1), (2, 1)]):
+            LaneAssignment.objects.create(athlete_competition=ac, event=self.event, lane_number=lane, heat_number=heat)
+        self.run_orders = generate_run_order(self.competition, self.event)
+        self.client.force_login(self.competition.organizer)
+        self.url = reverse('competitions:competition_run_order', args=[self.competition.pk, self.event.pk])
+
+    def test_next_lifter_comes_from_the_same_lane_by_heat_then_order(self):
+        current, later_heat, same_heat, other_lane = self.run_orders
+
+        self.client.post(self.url, {'action': 'complete_current_lifter', 'run_order_id': current.pk}, secure=True)
+
+        statuses = dict(CompetitionRunOrder.objects.filter(event=self.event).values_list('pk', 'status'))
+        self.assertEqual(statuses, {
+            current.pk: 'completed', same_heat.pk: 'current', later_heat.pk: 'pending', other_lane.pk: 'pending',
+        })
+
+
+@override_settings(**TEST_SETTINGS)
+class RunOrderFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(
+            name='Yoke', competition=self.competition, order=1, weight_type='time', number_of_lanes=2
+        )
+        for ac, lane in zip(self.athletes, [1, 1, 2]):
+            LaneAssignment.objects.create(athlete_competition=ac, event=self.event, lane_number=lane)
+        self.run_orders = generate_run_order(self.competition, self.event)
+        self.client.force_login(self.competition.organizer)
+        self.url = reverse('competitions:competition_run_order', args=[self.competition.pk, self.event.pk])
+
+    def get_fragment(self, fragment, **params):
+        url = reverse('competitions:run_order_fragment', args=[self.competition.pk, self.event.pk, fragment])
+        return self.client.get(url, params, secure=True)
+
+    def htmx_post(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data, headers={'HX-Request': 'true'}, secure=True)
+
+    def test_lane_fragment_renders_only_that_lane(self):
+        response = self.get_fragment('lane', lane=2)
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('id="lane-panel-2"', content)
+        self.assertNotIn('id="lane-panel-1"', content)
+        self.assertNotIn('hx-swap-oob', content)
+        self.assertIn(self.athletes[2].athlete.user.get_full_name(), content)
+
+    def test_unknown_lane_is_not_found(self):
+        self.assertEqual(self.get_fragment('lane', lane=3).status_code, 404)
+        self.assertEqual(self.get_fragment('lane', lane='x').status_code, 404)
+
+    def test_completing_a_lifter_swaps_its_lane_out_of_band(self):
+        current = self.run_orders[0]
+
+        response = self.htmx_post(action='complete_current_lifter', run_order_id=current.pk)
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        for element in ['lane-panel-1', 'lane-overview-1', 'run-order-messages']:
+            self.assertRegex(content, f'id="{element}"[^>]*hx-swap-oob="true"')
+        self.assertNotIn('lane-panel-2', content)
+        self.assertIn(self.athletes[1].athlete.user.get_full_name(), content)
+
+    def test_generating_the_run_order_refreshes_the_page(self):
+        response = self.htmx_post(action='generate_run_order', run_order_method='division_signup')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['HX-Refresh'], 'true')
+        self.assertFalse(response.content)
+
+
+@override_settings(**TEST_SETTINGS)
+class LaneBalancingTests(TestCase):
+    def setUp(self):
+        self.competition, self.division, self.weight_class = make_competition()
+
+    def test_flight_only_shares_a_heat_when_it_fits(self):
+        women = make_athletes(self.competition, self.division, self.weight_class, 3, gender='female')
+        men = make_athletes(self.competition, self.division, self.weight_class, 2, gender='male')
+
+        slots = balance_lanes(women + men, 4)
+
+        self.assertEqual([slots[ac.pk] for ac in women], [(1, 1), (2, 1), (3, 1)])
+        # Two men do not fit in the one lane left, so they start the next heat
+        self.assertEqual([slots[ac.pk] for ac in men], [(4, 2), (1, 2)])
+
+        slots = balance_lanes(women + men[:1], 4)
+
+        self.assertEqual(slots[men[0].pk], (4, 1))
+
+    def test_lane_counts_stay_within_one(self):
+        women = make_athletes(self.competition, self.division, self.weight_class, 5, gender='female')
+        men = make_athletes(self.competition, self.division, self.weight_class, 4, gender='male')
+
+        slots = balance_lanes(women + men, 3)
+
+        lane_counts = [[lane for lane, heat in slots.values()].count(lane) for lane in (1, 2, 3)]
+        self.assertLessEqual(max(lane_counts) - min(lane_counts), 1)
+        self.assertEqual(len(set(slots.values())), len(slots))
+        self.assertFalse({slots[ac.pk][1] for ac in women} & {slots[ac.pk][1] for ac in men})
+
+    def test_finalizing_check_in_auto_assigns_lanes_to_those_who_showed_up(self):
+        present, absent, late = make_athletes(self.competition, self.division, self.weight_class, 3)
+        event = Event.objects.create(
+            name='Yoke', competition=self.competition, order=1, weight_type='time', number_of_lanes=2
+        )
+        url = reverse('competitions:checkin_athletes', args=[self.competition.pk])
+
+        self.client.post(url, {
+            'finalize_check_in': '1',
+            'auto_assign_lanes': 'on',
+            f'showed_up_{present.pk}': 'on',
+            f'showed_up_{late.pk}': 'on',
+        }, secure=True)
+
+        self.assertFalse(AthleteCompetition.objects.filter(pk=absent.pk).exists())
+        self.assertEqual(
+            set(LaneAssignment.objects.filter(event=event)
+                .values_list('athlete_competition_id', 'lane_number', 'heat_number')),
+            {(present.pk, 1, 1), (late.pk, 2, 1)},
+        )
+
+
+@override_settings(**TEST_SETTINGS)
+class RunOrderBoardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.competition, division, weight_class = make_competition()
+        self.athletes = make_athletes(self.competition, division, weight_class, 3)
+        self.event = Event.objects.create(name='Yoke', competition=self.competition, order=1, weight_type='time')
+        generate_run_order(self.competition, self.event)
+
+    def athlete_ids(self):
+        return [ro.athlete_competition_id for ro in get_run_order_board(self.event)['run_orders']]
+
+    def test_withdrawn_registration_drops_off_the_cached_board(self):
+        a, b, c = self.athletes
+        self.assertEqual(self.athlete_ids(), [a.pk, b.pk, c.pk])
+
+        self.client.force_login(b.athlete.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('competitions:athletecompetition_delete', args=[b.pk]))
+
+        self.assertFalse(AthleteCompetition.objects.filter(pk=b.pk).exists())
+        self.assertEqual(self.athlete_ids(), [a.pk, c.pk])
@@ -0,0 +1,144 @@
+"""
+Event timing and ETAs.
+
+When a judge completes a lift, its duration (from the lifter being made
+current to the lift being completed) is folded into a rolling average for
+its lane, kept in the cache. Past lifts are never rescanned: each completion
+costs one cache read and one write. An event's average is its lanes'
+averages weighted by how many lifts each has timed.
+
+``predict_event`` turns those averages into the time each waiting athlete
+should go and the time each lane, and the event, should finish.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from competitions.lifting_order import in_lifting_order
+from competitions.models import CompetitionRunOrder
+
+# The rolling average follows roughly the last this many lifts of a lane.
+TIMING_WINDOW = 10
+# Used for lanes of an event that has not timed a lift yet.
+DEFAULT_ATTEMPT_SECONDS = 90
+# Longer "lifts" are breaks or a forgotten console, not attempts.
+MAX_ATTEMPT_SECONDS = 15 * 60
+TIMING_TIMEOUT = 60 * 60 * 24
+
+
+def lane_timing_cache_key(event_id, lane):
+    return f'event:{event_id}:lane:{lane}:timing'
+
+
+def record_lift(event_id, lane, started_at, completed_at):
+    """
+    Folds one lift into its lane's rolling average and returns the lane's
+    timing, or None if the lift has no usable duration.
+
+    The average is a plain mean until the lane has timed ``TIMING_WINDOW``
+    lifts, then an exponential moving average over about that many.
+    """
+    if started_at is None or completed_at is None:
+        return None
+    seconds = (completed_at - started_at).total_seconds()
+    if not 0 < seconds <= MAX_ATTEMPT_SECONDS:
+        return None
+
+    key = lane_timing_cache_key(event_id, lane)
+    timing = cache.get(key) or {'count': 0, 'average_seconds': 0.0}
+    count = timing['count'] + 1
+    average = timing['average_seconds'] + (seconds - timing['average_seconds']) / min(count, TIMING_WINDOW)
+    timing = {'count': count, 'average_seconds': average}
+    cache.set(key, timing, TIMING_TIMEOUT)
+    return timing
+
+
+def lane_timings(event_id, lanes):
+    """
+    The timing of each of the given lanes that has timed a lift.
+    """
+    keys = {lane_timing_cache_key(event_id, lane): lane for lane in lanes}
+    return {keys[key]: timing for key, timing in cache.get_many(list(keys)).items()}
+
+
+def event_average(timings):
+    count = sum(timing['count'] for timing in timings)
+    if not count:
+        return None
+    return sum(timing['average_seconds'] * timing['count'] for timing in timings) / count
+
+
+def lane_queues(event):
+    """
+    The current lifter and the waiting run orders of each lane, in lifting order.
+    """
+    queues = {}
+    run_orders = in_lifting_order(
+        CompetitionRunOrder.objects
+        .filter(event=event, status__in=['current', 'pending'])
+        .only('pk', 'event_id', 'athlete_competition_id', 'lane_number', 'heat_number', 'status', 'order',
+              'started_at'),
+        event,
+        'lane_number',
+    )
+    for ro in run_orders:
+        queue = queues.setdefault(ro.lane_number, {'current': None, 'pending': []})
+        if ro.status == 'current' and queue['current'] is None:
+            queue['current'] = ro
+        elif ro.status == 'pending':
+            queue['pending'].append(ro)
+    return queues
+
+
+def predict_event(event, queues=None, now=None):
+    """
+    Predicts when each waiting athlete goes and when the event finishes.
+
+    ``queues`` are the lane queues from ``lane_queues``, loaded if not
+    given. Each lane runs at its own rolling average, or the event's while
+    it has none, and the current lifter is given a full average from when
+    they started. Every waiting run order gets its ``expected_start``.
+    Returns the event's ``average_seconds`` and ``finishes_at`` and, per
+    lane, its ``average_seconds``, ``finishes_at`` and ``athletes``.
+    """
+    now = now or timezone.now()
+    if queues is None:
+        queues = lane_queues(event)
+    timings = lane_timings(event.pk, queues)
+    average = event_average(timings.values()) or DEFAULT_ATTEMPT_SECONDS
+
+    lanes = {}
+    for lane, queue in sorted(queues.items()):
+        lane_average = timings[lane]['average_seconds'] if lane in timings else average
+        step = timedelta(seconds=lane_average)
+        clock = now
+        current = queue['current']
+        if current is not None:
+            clock = max(now, (current.started_at or now) + step)
+
+        athletes = []
+        for ro in queue['pending']:
+            ro.expected_start = clock
+            athletes.append({
+                'run_order_id': ro.pk,
+                'athlete_id': ro.athlete_competition_id,
+                'expected_start': clock,
+            })
+            clock += step
+        lanes[lane] = {'average_seconds': lane_average, 'finishes_at': clock, 'athletes': athletes}
+
+    return {
+        'event_id': event.pk,
+        'average_seconds': average,
+        'finishes_at': max((lane['finishes_at'] for lane in lanes.values()), default=now),
+        'lanes': lanes,
+    }
+
+
+def expected_start(prediction, run_order_id):
+    for lane in prediction['lanes'].values():
+        for athlete in lane['athletes']:
+            if athlete['run_order_id'] == run_order_id:
+                return athlete['expected_start']
+    return None
@@ -86,6 +86,10 @@ urlpatterns = [
          name='competition_run_order'),
     path('competition/<int:competition_pk>/run-order/event/<int:event_pk>/', views.CompetitionRunOrderView.as_view(),
          name='competition_run_order'),
+    path('competition/<int:competition_pk>/run-order/event/<int:event_pk>/fragment/<str:fragment>/',
+         views.RunOrderFragmentView.as_view(), name='run_order_fragment'),
+    path('competition/<int:competition_pk>/run-order/event/<int:event_pk>/reorder/',
+         views.RunOrderReorderView.as_view(), name='run_order_reorder'),
     path('event/<int:event_pk>/edit/', views.update_event, name='update_event'),
     path('competitions/<int:competition_pk>/custom-division/add/', CustomDivisionCreateView.as_view(),
          name='add_custom_division'),
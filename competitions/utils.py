@@ -1,7 +1,11 @@
+import hashlib
+import time
+
 import boto3
 from openai import OpenAI
 from collections import defaultdict
 from competitions.models import AthleteCompetition, Competition, NationalsQualifier
+from django.core.cache import cache
 from django.db.models import Count, Q
 from django.db.utils import IntegrityError
 from django.conf import settings
@@ -9,15 +13,19 @@ from django.core.exceptions import PermissionDenied
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
+# boto3 clients are thread-safe, so one is shared rather than built per call
+s3 = boto3.client(
+    's3',
+    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+    region_name=settings.AWS_S3_REGION_NAME,
+)
 
-def generate_presigned_url(key, expires_in=3600):
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME,
-    )
+# Cached presigned URLs are handed out until this many seconds before they expire
+PRESIGNED_URL_MARGIN = 60 * 5
 
+
+def generate_presigned_url(key, expires_in=3600):
     return s3.generate_presigned_url(
         'get_object',
         Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key},
@@ -25,6 +33,26 @@ def generate_presigned_url(key, expires_in=3600):
     )
 
 
+def presigned_url_cache_key(key, expires_in):
+    return f'presigned_url:{expires_in}:{hashlib.md5(key.encode()).hexdigest()}'
+
+
+def cached_presigned_url(key, expires_in=3600):
+    """
+    Returns a presigned URL for the object and how many seconds it may still
+    be handed out for. URLs are signed once and reused from the cache until
+    ``PRESIGNED_URL_MARGIN`` seconds before they expire.
+    """
+    cache_key = presigned_url_cache_key(key, expires_in)
+    cached = cache.get(cache_key)
+    now = time.time()
+    if cached is None:
+        cached = (generate_presigned_url(key, expires_in), now + expires_in)
+        cache.set(cache_key, cached, max(expires_in - PRESIGNED_URL_MARGIN, 1))
+    url, expires_at = cached
+    return url, max(int(expires_at - now) - PRESIGNED_URL_MARGIN, 0)
+
+
 # competitions/utils.py
 def get_onboarding_status(competition):
     """
@@ -1,17 +1,19 @@
 import csv
+import json
 from collections import defaultdict
 
 from django import forms
 from django.db import transaction, IntegrityError
-from django.db.models import Max
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.core.mail import send_mass_mail
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views import View, generic
 from django.views.generic import TemplateView, CreateView
@@ -19,15 +21,22 @@ from django.views.generic.edit import FormView
 from django.forms import modelformset_factory
 
 from competitions.models import Competition, AthleteCompetition, Division, WeightClass, AthleteEventNote, \
-    LaneAssignment, CompetitionRunOrder, Event, Result, EventImplement, CompetitionStaff
+    LaneAssignment, CompetitionRunOrder, Event, EventImplement, CompetitionStaff
 from competitions.forms import EditWeightClassesForm, CustomWeightClassForm, CustomDivisionForm, \
     CombineWeightClassesForm, CustomDivisionFormSet, CustomWeightClassFormSetFactory, AddCompetitionStaffForm
 from competitions.utils import get_onboarding_status
-from competitions.views import calculate_points_and_rankings
+from competitions.attempts import has_pending_attempt, loading_order, record_attempt, request_attempt
+from competitions.lifting_order import in_lifting_order
+from competitions.live import publish_delta, touch_run_order
+from competitions.run_order import DEFAULT_RUN_ORDER_STRATEGY, RUN_ORDER_STRATEGIES, auto_assign_lanes, \
+    generate_run_order, get_run_order_board, reorder_run_order, run_order_choices, set_lane_assignments
+from competitions.scoring import submit_scores
+from competitions.timing import predict_event, record_lift
 from competitions.mixins import competition_permission_required, CompetitionAccessMixin
 
 
 from django.db.models import Q
+from django.db.models.functions import Coalesce
 
 class OrganizerCompetitionsView(TemplateView):
     template_name = "competitions/organizer_competitions.html"
@@ -233,72 +242,89 @@ class AthleteCheckInView(View):
 
         # --- Save Check-In (present, weigh-in, notes) ---
         if "save_check_in" in request.POST:
-            for athlete in athletes:
-                showed_up = request.POST.get(f"showed_up_{athlete.pk}") == "on"
-                weight_in = request.POST.get(f"weight_in_{athlete.pk}")
-
-                athlete.signed_up = showed_up
-                if weight_in:
-                    athlete.weigh_in = weight_in
-                athlete.save()
-
-                # Process event notes
-                for event in competition.events.all():
-                    note_types = request.POST.getlist(f"note_type_{athlete.pk}_{event.pk}")
-                    note_values = request.POST.getlist(f"note_value_{athlete.pk}_{event.pk}")
-
-                    # Remove any notes the user deleted
-                    AthleteEventNote.objects.filter(
-                        athlete_competition=athlete,
-                        event=event
-                    ).exclude(note_type__in=note_types).delete()
-
-                    # Update or create the submitted notes
-                    for i, note_type in enumerate(note_types):
-                        if note_type and i < len(note_values):
-                            note_val = note_values[i]
-                            if note_val:
-                                AthleteEventNote.objects.update_or_create(
-                                    athlete_competition=athlete,
-                                    event=event,
-                                    note_type=note_type,
-                                    defaults={'note_value': note_val}
-                                )
+            events = list(competition.events.all())
+            with transaction.atomic():
+                # Notes show on the run-order boards of every event
+                transaction.on_commit(lambda: touch_run_order([event.pk for event in events]))
+                for athlete in athletes:
+                    showed_up = request.POST.get(f"showed_up_{athlete.pk}") == "on"
+                    weight_in = request.POST.get(f"weight_in_{athlete.pk}")
+
+                    athlete.signed_up = showed_up
+                    if weight_in:
+                        athlete.weigh_in = weight_in
+                    athlete.save()
+
+                    # Process event notes
+                    for event in events:
+                        note_types = request.POST.getlist(f"note_type_{athlete.pk}_{event.pk}")
+                        note_values = request.POST.getlist(f"note_value_{athlete.pk}_{event.pk}")
+
+                        # Remove any notes the user deleted
+                        AthleteEventNote.objects.filter(
+                            athlete_competition=athlete,
+                            event=event
+                        ).exclude(note_type__in=note_types).delete()
+
+                        # Update or create the submitted notes
+                        for i, note_type in enumerate(note_types):
+                            if note_type and i < len(note_values):
+                                note_val = note_values[i]
+                                if note_val:
+                                    AthleteEventNote.objects.update_or_create(
+                                        athlete_competition=athlete,
+                                        event=event,
+                                        note_type=note_type,
+                                        defaults={'note_value': note_val}
+                                    )
 
             messages.success(request, "Athlete check-in data and notes saved successfully.")
 
         # --- Finalize Check-In (lanes + remove no-shows) ---
         if "finalize_check_in" in request.POST:
-            for athlete in athletes:
-                showed_up = request.POST.get(f"showed_up_{athlete.pk}") == "on"
-
-                if showed_up:
-                    # Persist lane & heat for multi-lane events
-                    for event in competition.events.all():
-                        if event.number_of_lanes > 1:
+            events = list(competition.events.all())
+            multi_lane_events = [event for event in events if event.number_of_lanes > 1]
+            auto_assign = request.POST.get("auto_assign_lanes") == "on"
+            lane_assignments = {event: {} for event in multi_lane_events}
+            no_shows = []
+
+            with transaction.atomic():
+                for athlete in athletes:
+                    showed_up = request.POST.get(f"showed_up_{athlete.pk}") == "on"
+
+                    if showed_up:
+                        if auto_assign:
+                            continue
+                        # Persist lane & heat for multi-lane events
+                        for event in multi_lane_events:
                             lane_val = request.POST.get(f"lane_{athlete.pk}_{event.pk}")
                             heat_val = request.POST.get(f"heat_{athlete.pk}_{event.pk}") or "1"
 
                             if lane_val and lane_val.isdigit():
-                                LaneAssignment.objects.update_or_create(
-                                    athlete_competition=athlete,
-                                    event=event,
-                                    defaults={
-                                        'lane_number': int(lane_val),
-                                        'heat_number': int(heat_val) if heat_val.isdigit() else 1
-                                    }
+                                lane_assignments[event][athlete.pk] = (
+                                    int(lane_val),
+                                    int(heat_val) if heat_val.isdigit() else 1
                                 )
                             else:
                                 # Delete if user cleared the lane select
-                                LaneAssignment.objects.filter(
-                                    athlete_competition=athlete,
-                                    event=event
-                                ).delete()
-                else:
-                    # Remove all notes, lanes, and the athlete record for no-shows
-                    AthleteEventNote.objects.filter(athlete_competition=athlete).delete()
-                    LaneAssignment.objects.filter(athlete_competition=athlete).delete()
-                    athlete.delete()
+                                lane_assignments[event][athlete.pk] = None
+                    else:
+                        no_shows.append(athlete.pk)
+
+                # Remove all notes, lanes, and the athlete records for no-shows
+                if no_shows:
+                    AthleteEventNote.objects.filter(athlete_competition__in=no_shows).delete()
+                    LaneAssignment.objects.filter(athlete_competition__in=no_shows).delete()
+                    AthleteCompetition.objects.filter(pk__in=no_shows).delete()
+
+                # Save lanes and move the athletes' run-order rows with them
+                for event in multi_lane_events:
+                    if auto_assign:
+                        auto_assign_lanes(competition, event)
+                    else:
+                        set_lane_assignments(event, lane_assignments[event])
+                # No-shows leave the run orders along with their registration
+                transaction.on_commit(lambda: touch_run_order([event.pk for event in events]))
 
             messages.success(request, "Check-in finalized and non-show athletes removed.")
 
@@ -611,6 +637,15 @@ def add_custom_weight_class(request, competition_pk):
 class CompetitionRunOrderView(CompetitionAccessMixin, View):
     template_name = 'competitions/competition_run_order.html'
     access_level = 'full'
+    # Pieces of the console that HTMX requests swap in on their own
+    fragment_templates = {
+        'lane': 'competitions/partials/run_order_lane.html',
+        'overview': 'competitions/partials/run_order_lane_overview.html',
+        'current': 'competitions/partials/run_order_current_lifter.html',
+        'notes': 'competitions/partials/notes_drawer.html',
+        'loading_order': 'competitions/partials/run_order_loading_order.html',
+    }
+
     def get(self, request, competition_pk, event_pk=None):
         competition = get_object_or_404(Competition, pk=competition_pk)
 
@@ -619,105 +654,22 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
             event_pk = events.first().pk
         current_event = get_object_or_404(Event, pk=event_pk) if event_pk else None
 
-        event_notes = {}
-        first_pending_index = 0
-
         if current_event:
-            run_orders = CompetitionRunOrder.objects.filter(
-                competition=competition,
-                event=current_event
-            ).select_related(
-                'athlete_competition__athlete__user',
-                'athlete_competition__division',
-                'athlete_competition__weight_class'
-            ).order_by('order')
-
-            results = Result.objects.filter(
-                event=current_event,
-                athlete_competition__competition=competition
-            ).select_related('athlete_competition')
-            results_map = {r.athlete_competition_id: r for r in results}
-
-            notes_qs = AthleteEventNote.objects.filter(
-                athlete_competition__competition=competition,
-                event=current_event
-            )
-
-            event_notes = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-            for note in notes_qs:
-                ac_id = note.athlete_competition_id
-                event_id = note.event_id
-                note_type = note.note_type
-                event_notes[ac_id][event_id][note_type].append({
-                    "id": note.id,
-                    "value": note.note_value,
-                    "attempt": note.attempt_number or 1
-                })
-
-            # NEW: pull lane assignments to override lane/heat from run_order
-            lane_map = {
-                (la.athlete_competition_id, la.event_id): la
-                for la in LaneAssignment.objects.filter(
-                    athlete_competition__competition=competition,
-                    event=current_event
-                )
-            }
-
-            # Initialize lanes_data for all possible lanes
-            lanes_data = {
-                lane_num: {'current': None, 'on_deck': None, 'pending': [], 'completed': [], 'heats': set()}
-                for lane_num in range(1, (current_event.number_of_lanes or 1) + 1)
-            }
-
-            for ro in run_orders:
-                ac_id = ro.athlete_competition_id
-                event_notes.setdefault(ac_id, {})
-
-                # Get lane/heat from LaneAssignment if it exists
-                assignment = lane_map.get((ac_id, current_event.id))
-                lane = assignment.lane_number if assignment else (ro.lane_number or 1)
-                heat = assignment.heat_number if assignment else (ro.heat_number or 1)
-
-                lanes_data[lane]['heats'].add(heat)
-
-                if ro.status == 'current':
-                    lanes_data[lane]['current'] = ro
-                elif ro.status == 'completed':
-                    ro.score = results_map.get(ac_id, None) and results_map[ac_id].value
-                    ro.points = results_map.get(ac_id, None) and results_map[ac_id].points_earned or 0
-                    lanes_data[lane]['completed'].append(ro)
-                else:
-                    lanes_data[lane]['pending'].append(ro)
-
-            for lane, data in lanes_data.items():
-                # Force correct order sequence per lane
-                data['pending'].sort(key=lambda x: x.order)
-                for idx, ro in enumerate(data['pending'], start=1):
-                    ro.order = idx  # Fix display order
-                if data['pending']:
-                    data['on_deck'] = data['pending'].pop(0)
-
-            for i, ro in enumerate(run_orders):
-                if ro.status == 'pending':
-                    first_pending_index = i
-                    break
-
-            load_chart = {}
-            for ro in run_orders:
-                ac_pk = ro.athlete_competition_id
-                load_chart.setdefault(ac_pk, [])
-                # You can populate load_chart here later if needed
-
+            board = get_run_order_board(current_event)
+            run_orders = board['run_orders']
+            lanes_data = board['lanes']
+            event_notes = board['notes']
+            first_pending_index = board['first_pending_index']
+            load_chart = {ro.athlete_competition_id: [] for ro in run_orders}
         else:
             run_orders = []
             load_chart = {}
             lanes_data = {}
+            event_notes = {}
+            first_pending_index = 0
 
         note_types = self.get_note_types_for_event(current_event) if current_event else []
 
-        for ac_id, evs in event_notes.items():
-            for ev_id, notes_dict in evs.items():
-                notes_dict.pop('', None)
         active_tab = request.GET.get('tab', '')
 
         context = {
@@ -731,10 +683,101 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
             'note_types': note_types,
             'load_chart': load_chart,
             'active_tab': active_tab,
+            'run_order_choices': run_order_choices(),
+            'loading_order': self.get_loading_order(current_event),
+            'multi_lane': bool(current_event and current_event.number_of_lanes > 1),
         }
 
         return render(request, self.template_name, context)
 
+    def get_fragment_context(self, competition, event):
+        board = get_run_order_board(event)
+        return {
+            'competition': competition,
+            'current_event': event,
+            'events': competition.events.all().order_by('order'),
+            'run_orders': board['run_orders'],
+            'lanes_data': board['lanes'],
+            'event_notes': board['notes'],
+            'multi_lane': event.number_of_lanes > 1,
+        }
+
+    def find_run_order(self, context, athlete_competition_id):
+        return next(
+            (ro for ro in context['run_orders'] if ro.athlete_competition_id == athlete_competition_id),
+            None
+        )
+
+    def render_fragments(self, request, competition, event, lanes=(), athletes=()):
+        """
+        Renders the lanes and notes drawers an action changed, plus the bar
+        loading order and the action's messages, for HTMX to swap out of band.
+        """
+        context = self.get_fragment_context(competition, event)
+        context['oob'] = True
+        fragments = []
+
+        lanes = set(lanes)
+        drawers = []
+        for athlete_competition_id in athletes:
+            run_order = self.find_run_order(context, athlete_competition_id)
+            if run_order:
+                drawers.append(run_order)
+                lanes.add(run_order.lane_number)
+
+        for lane_number in sorted(lanes):
+            lane_data = context['lanes_data'].get(lane_number)
+            if lane_data is None:
+                continue
+            lane_context = dict(context, lane_number=lane_number, lane_data=lane_data)
+            fragments.append(render_to_string(self.fragment_templates['lane'], lane_context, request))
+            if context['multi_lane']:
+                fragments.append(render_to_string(self.fragment_templates['overview'], lane_context, request))
+
+        for run_order in drawers:
+            fragments.append(
+                render_to_string(self.fragment_templates['notes'], dict(context, run_order=run_order), request)
+            )
+
+        if event.weight_type == 'max':
+            fragments.append(render_to_string(
+                self.fragment_templates['loading_order'],
+                dict(context, loading_order=self.get_loading_order(event)),
+                request
+            ))
+
+        fragments.append(render_to_string('competitions/partials/run_order_messages.html', context, request))
+        return HttpResponse('\n'.join(fragments))
+
+    def action_response(self, request, competition, event, lanes=(), athletes=(), refresh=False):
+        """
+        Sends the judge back to the console after an action. HTMX requests
+        get just the fragments that changed, or a full refresh when the
+        whole run order did.
+        """
+        if request.headers.get('HX-Request'):
+            if refresh:
+                response = HttpResponse()
+                response['HX-Refresh'] = 'true'
+                return response
+            return self.render_fragments(request, competition, event, lanes, athletes)
+
+        active_tab = request.POST.get('active_tab', '')
+        response = redirect('competitions:competition_run_order', competition_pk=competition.pk, event_pk=event.pk)
+        if active_tab:
+            response['Location'] += f'?tab={active_tab}'
+        return response
+
+    def get_loading_order(self, event, limit=10):
+        """
+        The next attempts to load on a max-weight event, as (athlete_competition, weight, attempt_number).
+        """
+        if not event or event.weight_type != 'max':
+            return []
+        upcoming = loading_order(event, limit)
+        athletes = AthleteCompetition.objects.select_related('athlete__user').in_bulk([ac_id for _, _, ac_id in upcoming])
+        return [(athletes[ac_id], weight, attempt_number) for weight, attempt_number, ac_id in upcoming]
+
     def get_note_types_for_event(self, event):
         if not event:
             return []
@@ -755,127 +798,26 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
         event = get_object_or_404(Event, pk=event_pk)
 
         action = request.POST.get('action')
+        # Lanes and athletes whose part of the console the action changed
+        changed_lanes = set()
+        changed_athletes = set()
 
+        # Actions that change the console publish a delta, which retires its
+        # cached board; notes aren't part of the delta and touch it directly.
         with transaction.atomic():
             if action == 'generate_run_order':
-                run_order_method = request.POST.get("run_order_method", "division_signup")
-
-                CompetitionRunOrder.objects.filter(competition=competition, event=event).delete()
-
-                if run_order_method == "last_man_standing":
-                    CompetitionRunOrder.objects.filter(competition=competition, event=event).delete()
-
-                    # Fetch all athlete notes relevant to this event
-                    notes = (
-                        AthleteEventNote.objects
-                        .filter(event=event, note_type__in=['opening_weight', 'next_attempt'])
-                        .exclude(note_value__isnull=True)
-                        .select_related('athlete_competition', 'athlete_competition__athlete__user')
-                    )
-
-                    # Parse weights and group by athlete_competition
-                    weight_map = {}
-                    for note in notes:
-                        try:
-                            weight = float(note.note_value)
-                            ac_id = note.athlete_competition_id
-                            weight_map.setdefault(ac_id, []).append(weight)
-                        except (TypeError, ValueError):
-                            continue
-
-                    # Compute the lowest relevant weight per athlete
-                    run_list = []
-                    for ac_id, weights in weight_map.items():
-                        try:
-                            ac = AthleteCompetition.objects.select_related('athlete__user').get(pk=ac_id)
-                            run_list.append((min(weights), ac))
-                        except AthleteCompetition.DoesNotExist:
-                            continue
-
-                    run_list.sort(key=lambda x: x[0])  # ascending by weight
-
-                    for order, (weight, ac) in enumerate(run_list, start=1):
-                        status = 'current' if order == 1 else 'pending'
-                        CompetitionRunOrder.objects.create(
-                            competition=competition,
-                            event=event,
-                            athlete_competition=ac,
-                            order=order,
-                            lane_number=1,
-                            heat_number=1,
-                            status=status,
-                            started_at=timezone.now() if status == 'current' else None
-                        )
-
-                    messages.success(request, f"Last Man Standing run order generated for {event.name}")
+                run_order_method = request.POST.get("run_order_method", DEFAULT_RUN_ORDER_STRATEGY)
+                strategy = RUN_ORDER_STRATEGIES.get(run_order_method)
+                if strategy is None:
+                    messages.error(request, "Unknown run order method.")
                 else:
-                    # FETCH all registered athletes grouped by division and sorted by registration
-                    athlete_comps = AthleteCompetition.objects.filter(
-                        competition=competition
-                    ).select_related('division', 'athlete__user', 'athlete', 'weight_class').order_by('athlete__gender',
-                                                                                                      'division__predefined_name',
-                                                                                                      'weight_class__name',
-                                                                                                      'registration_date')
-
-                    # BUILD and save new run order entries
-                    grouped = defaultdict(list)
-                    for ac in athlete_comps:
-                        division_label = ac.division.predefined_name or ac.division.custom_name or "Unassigned"
-                        gender = ac.athlete.gender
-                        weight_class = ac.weight_class.name if ac.weight_class else "Unassigned"
-                        group_key = (gender, division_label, weight_class)
-                        grouped[group_key].append(ac)
-
-                    order = 1
-                    for (gender, division_label, weight_class), group in grouped.items():
-                        for ac in group:
-                            assignment = LaneAssignment.objects.filter(
-                                athlete_competition=ac,
-                                event=event
-                            ).first()
-
-                            lane = assignment.lane_number if assignment else 1
-                            heat = assignment.heat_number if assignment else 1
-
-                            status = 'current' if order == 1 else 'pending'
-
-                            assignment = LaneAssignment.objects.filter(
-                                athlete_competition=ac,
-                                event=event
-                            ).first()
-
-                            lane = assignment.lane_number if assignment else 1
-                            heat = assignment.heat_number if assignment else 1
-
-                            CompetitionRunOrder.objects.create(
-                                competition=competition,
-                                event=event,
-                                athlete_competition=ac,
-                                order=order,
-                                lane_number=lane,
-                                heat_number=heat,
-                                status=status,
-                                started_at=timezone.now() if status == 'current' else None
-                            )
-
-                            order += 1
-
-                    messages.success(request, f"Run order generated by division and signup time for {event.name}")
-
-
-
+                    generate_run_order(competition, event, strategy.key)
+                    publish_delta(competition.pk, event_ids=[event.pk])
+                    messages.success(request, f"Run order generated for {event.name}: {strategy.label}")
 
             elif action == 'update_current_lifter':
                 ro = get_object_or_404(CompetitionRunOrder, pk=request.POST.get('run_order_id'))
-                assignment = LaneAssignment.objects.filter(
-                    athlete_competition=ro.athlete_competition,
-                    event=event
-                ).first()
-                lane = assignment.lane_number if assignment else (ro.lane_number or 1)
-
-                if ro.lane_number is None:
-                    ro.lane_number = 1
-                    ro.save(update_fields=['lane_number'])
+                lane = ro.lane_number
                 # Reset only current lifter in the same lane
                 CompetitionRunOrder.objects.filter(
                     competition=competition,
@@ -887,6 +829,8 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
                 ro.status = 'current'
                 ro.started_at = timezone.now()
                 ro.save()
+                publish_delta(competition.pk, event_ids=[event.pk])
+                changed_lanes.add(lane)
                 messages.success(
                     request,
                     f"Current lifter updated to {ro.athlete_competition.athlete.user.get_full_name()} in Lane {lane}"
@@ -900,8 +844,7 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
 
                 if not note_type or not note_value:
                     messages.error(request, "Both note type and value are required.")
-                    return redirect('competitions:competition_run_order', competition_pk=competition.pk,
-                                    event_pk=event.pk)
+                    return self.action_response(request, competition, event)
 
                 # Try parsing float if applicable
                 try:
@@ -909,6 +852,13 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
                 except (ValueError, TypeError):
                     note_value_float = None
 
+                # Check the weight before saving it, so a rejected weight isn't noted
+                if event.weight_type == 'max' and note_value_float is not None:
+                    try:
+                        request_attempt(ac, event, note_value_float)
+                    except ValidationError as e:
+                        messages.error(request, e.messages[0])
+                        return self.action_response(request, competition, event)
                 AthleteEventNote.objects.update_or_create(
                     athlete_competition=ac,
                     event=event,
@@ -918,6 +868,8 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
                         'note_value_float': note_value_float,
                     }
                 )
+                transaction.on_commit(lambda: touch_run_order([event.pk]))
+                changed_athletes.add(ac.pk)
                 messages.success(request, f"Note saved for {ac.athlete.user.get_full_name()}")
 
 
@@ -935,9 +887,13 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
 
                 mark_as_done = request.POST.get('mark_as_done') == 'on'
 
+                attempt_result = request.POST.get('attempt_result')
+
                 with transaction.atomic():
 
-                    current_ro = CompetitionRunOrder.objects.select_for_update().get(
+                    current_ro = CompetitionRunOrder.objects.select_for_update(of=('self',)).select_related(
+                        'athlete_competition__athlete__user'
+                    ).get(
 
                         pk=run_order_id,
 
@@ -949,88 +905,75 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
 
                     )
 
-                    # Determine lane
-
-                    assignment = LaneAssignment.objects.filter(
-
-                        athlete_competition=current_ro.athlete_competition,
-
-                        event=event
-
-                    ).first()
-
-                    lane = assignment.lane_number if assignment else (current_ro.lane_number or 1)
+                    lane = current_ro.lane_number
 
-                    # Save score as note + result
-                    if score:
-                        attempt_num = (
-                                              AthleteEventNote.objects.filter(
-                                                  athlete_competition=current_ro.athlete_competition,
-                                                  event=event,
-                                                  note_type='next_attempt'
-                                              ).aggregate(Max('attempt_number'))['attempt_number__max'] or 0
-                                      ) + 1
-
-                        AthleteEventNote.objects.create(
+                    # Save score as attempt or note + result
+                    # Without a weight, only a requested attempt can be judged;
+                    # otherwise the lifter just advances.
+                    if event.weight_type == 'max' and (
+                            score or has_pending_attempt(current_ro.athlete_competition_id, event)
+                    ):
+                        made = attempt_result != 'missed'
+                        try:
+                            record_attempt(
+                                current_ro.athlete_competition, event, made=made,
+                                weight=float(score) if score else None
+                            )
+                        except ValueError:
+                            messages.error(request, "Enter the attempt weight as a number.")
+                            return self.action_response(request, competition, event)
+                        except ValidationError as e:
+                            messages.error(request, e.messages[0])
+                            return self.action_response(request, competition, event)
+                        if not made:
+                            # A good lift publishes its delta from submit_scores.
+                            publish_delta(competition.pk, event_ids=[event.pk])
+                    elif score:
+                        try:
+                            score_float = float(score)
+                        except ValueError:
+                            score_float = None
+                        note = {'note_value': score, 'note_value_float': score_float}
+                        AthleteEventNote.objects.update_or_create(
                             athlete_competition=current_ro.athlete_competition,
                             event=event,
                             note_type='next_attempt',
-                            note_value=score,
-                            note_value_float=float(score),
-                            attempt_number=attempt_num
-                        )
-
-                        result, _ = Result.objects.get_or_create(
-                            athlete_competition=current_ro.athlete_competition,
-                            event=event,
-                            defaults={'value': score}
+                            defaults={**note, 'attempt_number': Coalesce('attempt_number', 0) + 1},
+                            create_defaults={**note, 'attempt_number': 1},
                         )
 
-                        result.value = score
-                        result.save()
-                        calculate_points_and_rankings(competition.pk, event.pk)
-                    # Promote lifters in order
-                    lane_ros = (
-                        CompetitionRunOrder.objects
-                        .select_for_update()
-                        .filter(
-                            competition=competition,
-                            event=event
-                        )
-                        .order_by('heat_number', 'order')
+                        submit_scores(competition, [(current_ro.athlete_competition_id, event.pk, score)])
+                    else:
+                        # A scored lift publishes its delta, lanes included, from submit_scores.
+                        publish_delta(competition.pk, event_ids=[event.pk])
+                    # Time the lift, whether or not the athlete is done
+                    finished_at = timezone.now()
+                    transaction.on_commit(
+                        lambda: record_lift(event.pk, lane, current_ro.started_at, finished_at)
                     )
-                    # Filter just this lane
-                    def get_lane(ro):
-                        la = LaneAssignment.objects.filter(
-                            athlete_competition=ro.athlete_competition,
-                            event=event
-                        ).first()
-                        return la.lane_number if la else ro.lane_number or 1
-                    lane_queue = [ro for ro in lane_ros if get_lane(ro) == lane]
-                    # Find index of current lifter
-                    try:
-                        idx = lane_queue.index(current_ro)
-                    except ValueError:
-                        messages.error(request, "Could not locate current lifter.")
-                        return redirect('competitions:competition_run_order', competition_pk=competition.pk,
-                                        event_pk=event.pk)
                     # Mark current as completed or re-queue
                     if not mark_as_done:
                         current_ro.status = 'completed'
-                        current_ro.completed_at = timezone.now()
+                        current_ro.completed_at = finished_at
                     else:
                         current_ro.status = 'pending'
                         current_ro.completed_at = None
-                    current_ro.save()
-                    # Promote next pending athlete to current
-                    promoted = None
-                    for ro in lane_queue[idx + 1:]:
-                        if ro.status == 'pending':
-                            ro.status = 'current'
-                            ro.started_at = timezone.now()
-                            ro.save()
-                            promoted = ro
-                            break
+                    current_ro.save(update_fields=['status', 'completed_at', 'updated_at'])
+                    # Promote the next pending athlete in this lane by lifting order, locking
+                    # only that row. A re-queued lifter waits for the others.
+                    promoted = in_lifting_order(
+                        CompetitionRunOrder.objects
+                        .select_for_update(of=('self',))
+                        .select_related('athlete_competition__athlete__user')
+                        .filter(event=event, lane_number=lane, status='pending')
+                        .exclude(pk=current_ro.pk),
+                        event,
+                    ).first()
+                    if promoted:
+                        promoted.status = 'current'
+                        promoted.started_at = timezone.now()
+                        promoted.save(update_fields=['status', 'started_at', 'updated_at'])
+                    changed_lanes.add(lane)
                     # Feedback
                     msg = f"{current_ro.athlete_competition.athlete.user.get_full_name()} marked as "
                     msg += "completed." if current_ro.status == 'completed' else "re-queued."
@@ -1040,6 +983,8 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
                         msg += " No more pending athletes in this lane."
                     if score:
                         msg += f" Score: {score}."
+                    if event.weight_type == 'max' and attempt_result == 'missed':
+                        msg += " Attempt missed."
                     messages.success(request, f"Lane {lane}: {msg}")
 
             elif action == 'reactivate_lifter':
@@ -1047,16 +992,88 @@ class CompetitionRunOrderView(CompetitionAccessMixin, View):
                                             status='completed')
                 comp_ro.status, comp_ro.completed_at = 'pending', None
                 comp_ro.save()
+                publish_delta(competition.pk, event_ids=[event.pk])
+                changed_lanes.add(comp_ro.lane_number)
                 messages.success(
                     request,
                     f"{comp_ro.athlete_competition.athlete.user.get_full_name()} reactivated in Lane {comp_ro.lane_number}."
                 )
 
-        active_tab = request.POST.get('active_tab', '')
-        response = redirect('competitions:competition_run_order', competition_pk=competition.pk, event_pk=event.pk)
-        if active_tab:
-            response['Location'] += f'?tab={active_tab}'
-        return response
+        return self.action_response(
+            request, competition, event, changed_lanes, changed_athletes,
+            refresh=action == 'generate_run_order'
+        )
+
+
+class RunOrderFragmentView(CompetitionRunOrderView):
+    """
+    One piece of the run-order console, for HTMX to poll or load on its own.
+
+    ``lane`` picks the lane for the lane, overview and current-lifter
+    fragments, and ``athlete`` the athlete for a notes drawer.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, competition_pk, event_pk, fragment):
+        competition = get_object_or_404(Competition, pk=competition_pk)
+        event = get_object_or_404(Event, pk=event_pk, competition=competition)
+        template = self.fragment_templates.get(fragment)
+        if template is None:
+            raise Http404("Unknown fragment.")
+
+        context = self.get_fragment_context(competition, event)
+        try:
+            if fragment == 'notes':
+                context['run_order'] = self.find_run_order(context, int(request.GET.get('athlete', '')))
+                if context['run_order'] is None:
+                    raise Http404("Athlete is not in this event's run order.")
+            elif fragment == 'loading_order':
+                context['loading_order'] = self.get_loading_order(event)
+            else:
+                context['lane_number'] = int(request.GET.get('lane', 1))
+                context['lane_data'] = context['lanes_data'].get(context['lane_number'])
+                if context['lane_data'] is None:
+                    raise Http404("Unknown lane.")
+        except ValueError:
+            raise Http404("Invalid fragment parameters.")
+
+        return HttpResponse(render_to_string(template, context, request))
+
+
+class RunOrderReorderView(CompetitionAccessMixin, View):
+    """
+    POST { "lanes": { "<lane>": [<run order id>, ...] }, "partial": false }
+      → { "updated": n, "orders": { "<run order id>": order }, "heats": { "<run order id>": heat } }
+
+    Reorders lane queues in one transaction. A drag-and-drop client can set
+    ``partial`` and send just the rows it moved in each lane.
+    """
+    access_level = 'full'
+    http_method_names = ['post']
+
+    def post(self, request, competition_pk, event_pk):
+        competition = get_object_or_404(Competition, pk=competition_pk)
+        event = get_object_or_404(Event, pk=event_pk, competition=competition)
+
+        try:
+            data = json.loads(request.body)
+            lanes = {int(lane): [int(pk) for pk in ids] for lane, ids in data['lanes'].items()}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return JsonResponse({'error': 'Expected {"lanes": {"<lane>": [<run order id>, ...]}}.'}, status=400)
+
+        try:
+            with transaction.atomic():
+                changed = reorder_run_order(event, lanes, partial=bool(data.get('partial')))
+                if changed:
+                    publish_delta(competition.pk, event_ids=[event.pk])
+        except ValidationError as e:
+            return JsonResponse({'error': e.messages[0]}, status=400)
+
+        return JsonResponse({
+            'updated': len(changed),
+            'orders': {ro.pk: ro.order for ro in changed},
+            'heats': {ro.pk: ro.heat_number for ro in changed},
+        })
 
 
 class CompetitionDisplayView(LoginRequiredMixin, View):
@@ -1065,23 +1082,15 @@ class CompetitionDisplayView(LoginRequiredMixin, View):
     def get(self, request, competition_pk, event_pk=None):
         competition = get_object_or_404(Competition, pk=competition_pk)
         current_event = get_object_or_404(Event, pk=event_pk) if event_pk else competition.current_event
-        events = competition.events.all().order_by('order')
 
-        run_orders = CompetitionRunOrder.objects.filter(
-            competition=competition, event=current_event
+        # Lane queues in lifting order
+        run_orders = in_lifting_order(CompetitionRunOrder.objects.filter(
+            competition=competition, event=current_event, status__in=['current', 'pending']
         ).select_related(
             'athlete_competition__athlete__user',
             'athlete_competition__division',
             'athlete_competition__weight_class'
-        ).order_by('order')
-
-        lane_map = {
-            (la.athlete_competition_id, la.event_id): la
-            for la in LaneAssignment.objects.filter(
-                athlete_competition__competition=competition,
-                event=current_event
-            )
-        }
+        ), current_event, 'lane_number')
 
         lanes_data = {
             lane_num: {'current': None, 'on_deck': None, 'pending': []}
@@ -1089,17 +1098,15 @@ class CompetitionDisplayView(LoginRequiredMixin, View):
         }
 
         for ro in run_orders:
-            ac_id = ro.athlete_competition_id
-            assignment = lane_map.get((ac_id, current_event.id))
-            lane = assignment.lane_number if assignment else (ro.lane_number or 1)
-
+            lane = lanes_data.setdefault(ro.lane_number, {'current': None, 'on_deck': None, 'pending': []})
             if ro.status == 'current':
-                lanes_data[lane]['current'] = ro
-            elif ro.status == 'pending':
-                lanes_data[lane]['pending'].append(ro)
+                lane['current'] = ro
+            else:
+                lane['pending'].append(ro)
+
+        eta = predict_event(current_event, lanes_data)
 
         for lane, data in lanes_data.items():
-            data['pending'].sort(key=lambda x: x.order)
             if data['pending']:
                 data['on_deck'] = data['pending'].pop(0)
 
@@ -1107,6 +1114,7 @@ class CompetitionDisplayView(LoginRequiredMixin, View):
             'competition': competition,
             'current_event': current_event,
             'lanes_data': lanes_data,
+            'eta': eta,
             'hide_navbar': True,
         }
         return render(request, self.template_name, context)
@@ -1117,30 +1125,42 @@ def manual_run_order_edit(request, competition_pk, event_pk):
     event = get_object_or_404(Event, pk=event_pk, competition=competition)
 
     if request.method == "POST":
-        # Save lane assignment per division
-        for key, value in request.POST.items():
-            if key.startswith("lane_division_"):
-                division_id = key.split("_")[-1]
-                try:
-                    division_id = int(division_id)
-                    lane_number = int(value)
-                    CompetitionRunOrder.objects.filter(
-                        event=event,
-                        athlete_competition__division_id=division_id
-                    ).update(lane_number=lane_number)
-                except ValueError:
-                    continue
+        with transaction.atomic():
+            # Save lane assignment per division
+            division_lanes = {}
+            for key, value in request.POST.items():
+                if key.startswith("lane_division_"):
+                    division_id = key.split("_")[-1]
+                    try:
+                        division_lanes[int(division_id)] = int(value)
+                    except ValueError:
+                        continue
+            if division_lanes:
+                athletes = CompetitionRunOrder.objects.filter(
+                    event=event,
+                    athlete_competition__division_id__in=division_lanes
+                ).values_list('athlete_competition_id', 'athlete_competition__division_id')
+                # Athletes keep their heat; the run order follows their new lane
+                set_lane_assignments(event, {
+                    ac_id: (division_lanes[division_id], None) for ac_id, division_id in athletes
+                })
 
-        # Save individual order
-        for key, value in request.POST.items():
-            if key.startswith("order_ro_"):
-                ro_id = key.split("_")[-1]
-                try:
-                    ro = CompetitionRunOrder.objects.get(id=ro_id, event=event)
-                    ro.order = int(value)
-                    ro.save()
-                except (CompetitionRunOrder.DoesNotExist, ValueError):
-                    continue
+            # Save individual order
+            orders = {}
+            for key, value in request.POST.items():
+                if key.startswith("order_ro_"):
+                    try:
+                        orders[int(key.split("_")[-1])] = int(value)
+                    except ValueError:
+                        continue
+            changed = []
+            for ro in CompetitionRunOrder.objects.filter(event=event, pk__in=list(orders)):
+                if ro.order != orders[ro.pk]:
+                    ro.order = orders[ro.pk]
+                    ro.updated_at = timezone.now()
+                    changed.append(ro)
+            CompetitionRunOrder.objects.bulk_update(changed, ['order', 'updated_at'])
+            publish_delta(competition.pk, event_ids=[event.pk])
 
         messages.success(request, "Run order and lanes updated.")
         return redirect("competitions:manual_run_order_edit", competition_pk=competition.pk, event_pk=event.pk)
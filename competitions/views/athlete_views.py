@@ -1,6 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
@@ -12,6 +13,7 @@ from ComPodium.settings import base as settings
 from accounts.models import User, AthleteProfile
 from competitions.models import Competition, AthleteCompetition, TshirtSize, Division, WeightClass
 from competitions.forms import AthleteCompetitionForm, AthleteProfileForm, ManualAthleteAddForm
+from competitions.live import touch_run_order
 
 
 from django.shortcuts import get_object_or_404, render
@@ -291,12 +293,19 @@ class AthleteCompetitionDeleteView(LoginRequiredMixin, UserPassesTestMixin, gene
     template_name = 'competitions/athletecompetition_confirm_delete.html'
 
     def get_success_url(self):
-        return reverse_lazy('competitions:competition_detail', kwargs={'pk': self.object.competition.pk})
+        return reverse_lazy('competitions:competition_detail', kwargs={'slug': self.object.competition.slug})
 
     def test_func(self):
         registration = self.get_object()
         return self.request.user == registration.athlete.user  # Check if the logged-in user is the athlete
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # The withdrawn athlete drops off the competition's run-order boards
+        event_ids = list(self.object.competition.events.values_list('pk', flat=True))
+        transaction.on_commit(lambda: touch_run_order(event_ids))
+        return response
+
 class AthleteListView(ListView):
     model = AthleteCompetition
     template_name = 'competitions/athlete_list.html'
@@ -1,14 +1,12 @@
-from math import prod
 from django.shortcuts import get_object_or_404, render
 from django.views import View
 from competitions.models import (
     Competition,
     CompetitionRunOrder,
-    Result,
-    Event,
-    WeightClass,
-    AthleteCompetition
 )
+from competitions.lifting_order import in_lifting_order
+from competitions.standings import find_group, get_standings
+from competitions.timing import expected_start, predict_event
 
 class CompetitionBroadcastView(View):
     template_name = 'competitions/competition_broadcast.html'
@@ -21,11 +19,13 @@ class CompetitionBroadcastView(View):
         on_deck = None
         current_lane = None
         event_weight = None
+        eta = None
         mini_scorecard = []
-        all_results = []
-        ordered_events = competition.events.all().order_by('order')
+        standings = get_standings(competition)
 
         if current_event:
+            eta = predict_event(current_event)
+
             # Get current lifter(s)
             current_ros = CompetitionRunOrder.objects.filter(
                 competition=competition,
@@ -39,15 +39,17 @@ class CompetitionBroadcastView(View):
 
             if current_ros.exists():
                 current_lifter = current_ros.first()
-                current_lane = current_lifter.lane_number or 1
+                current_lane = current_lifter.lane_number
 
                 # Get on-deck
-                on_deck = CompetitionRunOrder.objects.filter(
+                on_deck = in_lifting_order(CompetitionRunOrder.objects.filter(
                     competition=competition,
                     event=current_event,
                     status='pending',
                     lane_number=current_lane
-                ).order_by('order').first()
+                ), current_event).first()
+                if on_deck:
+                    on_deck.expected_start = expected_start(eta, on_deck.pk)
 
                 # Get event implement weight for current lifter's weight class
                 wc = current_lifter.athlete_competition.weight_class
@@ -56,34 +58,17 @@ class CompetitionBroadcastView(View):
                     if ew_qs.exists():
                         event_weight = ew_qs.first().weight
 
-                # Mini scorecard (division + class only)
+                # Mini scorecard (the current lifter's flight)
                 ac = current_lifter.athlete_competition
-                mini_scorecard = AthleteCompetition.objects.filter(
-                    competition=competition,
-                    division=ac.division,
-                    weight_class=ac.weight_class
-                ).select_related('athlete__user').prefetch_related('results').order_by('rank')
-
-                all_results = Result.objects.filter(
-                    event__competition=competition,
-                    athlete_competition__in=mini_scorecard
-                ).select_related('event')
-
-        # Full grouped scorecard data
-        grouped_athletes = {}
-        all_athletes = AthleteCompetition.objects.filter(competition=competition).select_related(
-            'athlete__user',
-            'division',
-            'weight_class'
-        ).prefetch_related('results')
-
-        for ac in all_athletes:
-            group_key = (
-                ac.division.name if ac.division else "Unassigned",
-                getattr(ac.athlete, 'gender', "Unspecified"),
-                f"{ac.weight_class.weight_d}{ac.weight_class.name}" if ac.weight_class else "Unassigned"
-            )
-            grouped_athletes.setdefault(group_key, []).append(ac)
+                group = find_group(standings, ac.division_id, ac.athlete.gender, ac.weight_class_id)
+                event_index = next(
+                    (i for i, event in enumerate(standings['events']) if event['id'] == current_event.pk), None
+                )
+                if group and event_index is not None:
+                    mini_scorecard = [
+                        dict(athlete, result=athlete['results'][event_index])
+                        for athlete in group['athletes']
+                    ]
 
         context = {
             'competition': competition,
@@ -91,10 +76,10 @@ class CompetitionBroadcastView(View):
             'current_lifter': current_lifter,
             'on_deck': on_deck,
             'event_weight': event_weight,
+            'eta': eta,
             'mini_scorecard': mini_scorecard,
-            'results': all_results,
-            'ordered_events': ordered_events,
-            'grouped_athletes': grouped_athletes,
-            'even_col_span': len(ordered_events) * 3,
+            'ordered_events': standings['events'],
+            'grouped_athletes': standings['groups'],
+            'event_col_span': len(standings['events']) * 3,
         }
         return render(request, self.template_name, context)
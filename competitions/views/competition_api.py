@@ -1,19 +1,35 @@
+import asyncio
+import json
 from datetime import date
 
-from django.http import HttpResponseNotFound
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.core.exceptions import ValidationError
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect, reverse
+from django.utils import dateformat, timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework import generics, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from competitions.models import Competition, AthleteCompetition, CompetitionRunOrder, Event
+from rest_framework.utils.encoders import JSONEncoder
+from competitions.models import Competition, AthleteCompetition, CompetitionRunOrder, Event, Result
 from accounts.models import AthleteProfile, User
-from competitions.serializers import CompetitionSerializer, AthleteCompetitionSerializer
+from competitions.serializers import CompetitionSerializer, AthleteCompetitionSerializer, ScoreEntrySerializer, \
+    ScoredResultSerializer
+from competitions.scoring import submit_scores
 from rest_framework.permissions import IsAuthenticated, BasePermission, AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from competitions.utils import generate_presigned_url
+from competitions.lifting_order import in_lifting_order
+from competitions.timing import predict_event
+from competitions.utils import cached_presigned_url
+from competitions.vmix import feed_group_name, feed_time, feed_version, get_feed
 
 
 @api_view(["GET"])
@@ -22,8 +38,12 @@ def serve_profile_picture(request, user_id):
     user = get_object_or_404(User, pk=user_id)
 
     if user.profile_picture:
-        url = generate_presigned_url(user.profile_picture.name)
-        return redirect(url)
+        url, max_age = cached_presigned_url(user.profile_picture.name)
+        response = redirect(url)
+        # The redirect's URL stays the same when the picture changes, so only
+        # the client may keep it; a shared cache would serve the old picture.
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response
 
     return HttpResponseNotFound("No profile picture found.")
 
@@ -38,6 +58,35 @@ class IsReadOnlyUser(BasePermission):
         return request.user.username == 'vmix_user' or 'blake' and request.method in ['GET', 'HEAD', 'OPTIONS']
 
 
+def _vmix_feed(request, feed, build):
+    """
+    Serve a vMix feed from its precomputed payload, or an empty 304 when the
+    client's If-None-Match still matches it.
+    """
+    try:
+        competition_id = int(request.GET.get("competitionID"))
+    except (TypeError, ValueError):
+        return Response(build(request))
+
+    data, etag = get_feed(competition_id, feed, _feed_params(request), lambda: build(request))
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in if_none_match or "*" in if_none_match:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _feed_params(request):
+    """
+    The query parameters a feed payload is cached under. Image URLs are
+    absolute, so the scheme and host the feed was requested on count too.
+    """
+    return dict(request.GET.items(), origin=request.build_absolute_uri("/"))
+
+
 def _format_height_inches(h):
     """
     Convert an integer height in inches to 'XFT YIN' format.
@@ -50,6 +99,15 @@ def _format_height_inches(h):
         return ""
 
 
+def _format_eta(moment):
+    """
+    Format a predicted time as local 'H:MM AM/PM', or '' if there is none.
+    """
+    if moment is None:
+        return ""
+    return dateformat.format(timezone.localtime(moment), "g:i A")
+
+
 def _calculate_age(dob):
     """
     Calculate age in years from a date_of_birth.
@@ -104,6 +162,43 @@ class CompetitionAthletesAPI(APIView):
         return Response(serializer.data)
 
 
+@extend_schema(
+    summary="Submit a batch of scores",
+    description="Records scores for any number of (athlete_competition, event, value) entries in one request. "
+                "Each affected flight is re-scored once. Returns the saved results with their updated points and ranks.",
+    parameters=[
+        OpenApiParameter(name="pk", description="Competition ID", required=True, type=int),
+    ],
+    request=ScoreEntrySerializer(many=True),
+    responses={200: ScoredResultSerializer(many=True)},
+    tags=["Scoring"],
+)
+class CompetitionScoresAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        competition = get_object_or_404(Competition, pk=pk)
+        if not competition.has_any_access(request.user):
+            return Response({"error": "You do not have access to score this competition."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        serializer = ScoreEntrySerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        entries = [(e['athlete_competition'], e['event'], e['value']) for e in serializer.validated_data]
+        try:
+            submit_scores(competition, entries)
+        except ValidationError as e:
+            return Response({"errors": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        submitted = {(ac_id, event_id) for ac_id, event_id, _ in entries}
+        results = Result.objects.filter(
+            athlete_competition_id__in={ac_id for ac_id, _ in submitted},
+            event_id__in={event_id for _, event_id in submitted},
+        ).order_by('event_id', 'athlete_competition_id')
+        results = [r for r in results if (r.athlete_competition_id, r.event_id) in submitted]
+        return Response(ScoredResultSerializer(results, many=True).data)
+
+
 @extend_schema(
     parameters=[
         OpenApiParameter(name='name', description='Full name of the athlete (e.g. John Smith)', required=True,
@@ -151,7 +246,7 @@ def api_guide(request):
 @extend_schema(
     summary="vMix: Top-N Leaderboard",
     parameters=[
-        # competitionID, weightClassID, listSize in query string
+        # competitionID, weightClassID and/or divisionID (comma-separated), listSize in query string
     ],
     responses={200: dict(many=True)},
     methods=["GET"],
@@ -160,198 +255,348 @@ def api_guide(request):
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def leaderboard(request):
-    comp_id = request.GET.get("competitionID")
-    weight_id = request.GET.get("weightClassID")
+    return _vmix_feed(request, "leaderboard", _leaderboard_data)
+
+
+def _leaderboard_ids(value):
+    """
+    Parse a comma-separated list of ids, skipping anything that is not one.
+    """
+    return [int(part) for part in (value or "").split(",") if part.strip().isdigit()]
+
+
+def _leaderboard_data(request):
     try:
         list_size = int(request.GET.get("listSize", 10))
     except ValueError:
         list_size = 10
+    return _leaderboard_rows(
+        request.GET.get("competitionID"),
+        _leaderboard_ids(request.GET.get("weightClassID")),
+        _leaderboard_ids(request.GET.get("divisionID")),
+        list_size,
+    )
+
+
+def _leaderboard_rows(comp_id, weight_ids, division_ids, list_size):
+    # One or more classes (all classes of the given divisions); with neither
+    # given, the registrations that have no weight class.
+    regs = AthleteCompetition.objects.filter(competition_id=comp_id)
+    if weight_ids:
+        regs = regs.filter(weight_class_id__in=weight_ids)
+    if division_ids:
+        regs = regs.filter(division_id__in=division_ids)
+    if not weight_ids and not division_ids:
+        regs = regs.filter(weight_class__isnull=True)
 
-    # Top N by total_points in that class
+    # Top N of each flight (weight class, division and gender, as stored
+    # ranks are) by rank, ties broken by points then name.
     regs = (
-        AthleteCompetition.objects
-        .filter(competition_id=comp_id, weight_class_id=weight_id)
-        .order_by("-total_points")[:list_size]
-    )  # :contentReference[oaicite:0]{index=0}
+        regs
+        .select_related("athlete__user", "division", "weight_class")
+        .annotate(position=Window(
+            expression=RowNumber(),
+            partition_by=[F("weight_class_id"), F("division_id"), F("athlete__gender")],
+            order_by=[
+                F("rank").asc(nulls_last=True),
+                F("total_points").desc(),
+                F("athlete__user__last_name").asc(),
+                F("athlete__user__first_name").asc(),
+                F("pk").asc(),
+            ],
+        ))
+        .filter(position__lte=list_size)
+        .order_by("weight_class__division_id", "weight_class__name", "-weight_class__weight_d", "weight_class_id",
+                  "division_id", "athlete__gender", "position")
+    )
 
     data = []
-    for idx, ac in enumerate(regs, start=1):
-        div = ac.division  # Division instance
+    for ac in regs:
+        div = ac.division
         wc = ac.weight_class
         data.append({
-            "className": f"{div.name} – {wc.name}{wc.weight_d}",
-            "position": idx,
+            "className": f"{div.name if div else ''} – {f'{wc.name}{wc.weight_d}' if wc else ''}",
+            "divisionID": ac.division_id,
+            "weightClassID": ac.weight_class_id,
+            "position": ac.position,
+            "rank": ac.rank,
             "athleteName": ac.athlete.user.get_full_name().upper(),
             "points": ac.total_points,
         })
 
-    return Response(data)
+    return data
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def current_competitors(request):
-    comp_id = request.GET.get("competitionID")
+def _feed_event(request):
+    """
+    The competition and the event a feed is for: ``eventID`` if given, else
+    the current event (None when there is none).
+    """
+    competition = get_object_or_404(Competition, pk=request.GET.get("competitionID"))
     event_id = request.GET.get("eventID")
-
-    competition = get_object_or_404(Competition, pk=comp_id)
-
     if event_id:
         event = get_object_or_404(Event, pk=event_id, competition=competition)
     else:
         event = competition.current_event
+    return competition, event
 
-    if not event:
-        return Response([])
 
-    ros = (
+def _lane_queues(competition, event):
+    """
+    The current lifter and the waiting run orders of each lane, in lifting
+    order, from a single query. Shaped like ``competitions.timing.lane_queues``.
+    """
+    queues = {}
+    run_orders = in_lifting_order(
         CompetitionRunOrder.objects
-        .filter(competition=competition, event=event, status="current")
-        .order_by("lane_number", "order")
+        .filter(competition=competition, event=event, status__in=["current", "pending"])
+        .select_related("athlete_competition__athlete__user", "athlete_competition__division",
+                        "athlete_competition__weight_class"),
+        event,
+        "lane_number",
     )
+    for ro in run_orders:
+        queue = queues.setdefault(ro.lane_number, {"current": None, "pending": []})
+        if ro.status == "current" and queue["current"] is None:
+            queue["current"] = ro
+        elif ro.status == "pending":
+            queue["pending"].append(ro)
+    return queues
+
+
+def _competitor(request, event, lane, ro):
+    ac = ro.athlete_competition
+    prof = ac.athlete
+    user = prof.user
+    return {
+        "eventID": event.pk,
+        "eventName": event.name,
+        "lane": lane,
+        "name": user.get_full_name().upper(),
+        "nickname": prof.nickname,
+        "instagram": getattr(user, "instagram_name", ""),
+        "gender": prof.gender,
+        "height": _format_height_inches(prof.height),
+        "weight": str(prof.weight) if prof.weight else "",
+        "age": _calculate_age(prof.date_of_birth),
+        "division": ac.division.name if ac.division else "",
+        "weight_class": (
+            f"u{ac.weight_class.name}" if ac.weight_class.weight_d == "u"
+            else f"{ac.weight_class.name}+" if ac.weight_class.weight_d == "+"
+            else ac.weight_class.name
+        ) if ac.weight_class else "",
+        "street": prof.street_number,
+        "city": prof.city,
+        "state": prof.state,
+        "zip_code": prof.zip_code,
+        "home_gym": prof.home_gym,
+        "team": prof.team_name,
+        "coach": prof.coach,
+        "bio": prof.bio,
+        "imageUrl": request.build_absolute_uri(
+            reverse("serve_profile_picture", args=[user.id])
+        ) if user.profile_picture else "",
+    }
+
+
+def _current_competitors(request, event, queues):
+    return [
+        _competitor(request, event, lane, queue["current"])
+        for lane, queue in sorted(queues.items()) if queue["current"]
+    ]
 
-    current_by_lane = {}
-    for ro in ros:
-        lane = ro.lane_number or 1
-        if lane not in current_by_lane:
-            current_by_lane[lane] = ro
 
+def _up_next_competitors(request, event, queues):
+    # Sets expected_start on every waiting run order
+    predict_event(event, queues, now=feed_time(event.competition_id))
     data = []
-    for lane, ro in current_by_lane.items():
+    for lane, queue in sorted(queues.items()):
+        if not queue["pending"]:
+            continue
+        ro = queue["pending"][0]
         ac = ro.athlete_competition
-        prof = ac.athlete
-        user = prof.user
+        data.append(dict(
+            _competitor(request, event, lane, ro),
+            eta=_format_eta(ro.expected_start),
+            weight_class=ac.weight_class.name if ac.weight_class else "",
+        ))
+    return data
 
-        data.append({
-            "eventID": event.pk,
-            "eventName": event.name,
-            "lane": lane,
-            "name": user.get_full_name().upper(),
-            "nickname": prof.nickname,
-            "instagram": getattr(user, "instagram_name", ""),
-            "gender": prof.gender,
-            "height": _format_height_inches(prof.height),
-            "weight": str(prof.weight) if prof.weight else "",
-            "age": _calculate_age(prof.date_of_birth),
-            "division": ac.division.name if ac.division else "",
-            "weight_class": (
-                f"u{ac.weight_class.name}" if ac.weight_class.weight_d == "u"
-                else f"{ac.weight_class.name}+" if ac.weight_class.weight_d == "+"
-                else ac.weight_class.name
-            ) if ac.weight_class else "",
-            "street": prof.street_number,
-            "city": prof.city,
-            "state": prof.state,
-            "zip_code": prof.zip_code,
-            "home_gym": prof.home_gym,
-            "team": prof.team_name,
-            "coach": prof.coach,
-            "bio": prof.bio,
-            "imageUrl": request.build_absolute_uri(
-                reverse("serve_profile_picture", args=[user.id])
-            ) if user.profile_picture else "",
 
-        })
+def _current_event_row(event, queues):
+    # The first current lifter in the run order
+    current_ro = next((queue["current"] for _, queue in sorted(queues.items()) if queue["current"]), None)
 
-    return Response(data)
+    if current_ro:
+        ac = current_ro.athlete_competition
+        division_name = ac.division.name if ac.division else ""
+        weight_class_name = ac.weight_class.name if ac.weight_class else ""
+        gender = ac.athlete.gender if ac.athlete and ac.athlete.gender else ""
+        event_class = f"{division_name} - {weight_class_name}".strip(" -")
+    else:
+        event_class = ""
+        gender = ""
+
+    return {
+        "event_name": event.name,
+        "event_class": event_class,
+        "gender": gender,
+        "estimated_finish": _format_eta(
+            predict_event(event, queues, now=feed_time(event.competition_id))["finishes_at"]
+        ),
+    }
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
-def up_next_competitors(request):
-    comp_id = request.GET.get("competitionID")
-    event_id = request.GET.get("eventID")
-
-    competition = get_object_or_404(Competition, pk=comp_id)
+def current_competitors(request):
+    return _vmix_feed(request, "current_competitors", _current_competitors_data)
 
-    if event_id:
-        event = get_object_or_404(Event, pk=event_id, competition=competition)
-    else:
-        event = competition.current_event
 
+def _current_competitors_data(request):
+    competition, event = _feed_event(request)
     if not event:
-        return Response([])
+        return []
+    return _current_competitors(request, event, _lane_queues(competition, event))
 
-    pending_qs = (
-        CompetitionRunOrder.objects
-        .filter(competition=competition, event=event, status="pending")
-        .order_by("lane_number", "order")
-    )
 
-    next_by_lane = {}
-    for ro in pending_qs:
-        lane = ro.lane_number or 1
-        if lane not in next_by_lane:
-            next_by_lane[lane] = ro
-
-    data = []
-    for lane, ro in next_by_lane.items():
-        ac = ro.athlete_competition
-        prof = ac.athlete
-        user = prof.user
-        data.append({
-            "eventID": event.pk,
-            "eventName": event.name,
-            "lane": ro.lane_number or 1,
-            "name": user.get_full_name().upper(),
-            "nickname": prof.nickname,
-            "instagram": getattr(user, "instagram_name", ""),
-            "gender": prof.gender,
-            "height": _format_height_inches(prof.height),
-            "weight": str(prof.weight) if prof.weight else "",
-            "age": _calculate_age(prof.date_of_birth),
-            "division": ac.division.name if ac.division else "",
-            "weight_class": ac.weight_class.name if ac.weight_class else "",
-            "street": prof.street_number,
-            "city": prof.city,
-            "state": prof.state,
-            "zip_code": prof.zip_code,
-            "home_gym": prof.home_gym,
-            "team": prof.team_name,
-            "coach": prof.coach,
-            "bio": prof.bio,
-            "imageUrl": request.build_absolute_uri(
-                reverse("serve_profile_picture", args=[user.id])
-            ) if user.profile_picture else "",
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def up_next_competitors(request):
+    return _vmix_feed(request, "up_next_competitors", _up_next_competitors_data)
 
-        })
 
-    return Response(data)
+def _up_next_competitors_data(request):
+    competition, event = _feed_event(request)
+    if not event:
+        return []
+    return _up_next_competitors(request, event, _lane_queues(competition, event))
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def current_event(request):
-    comp_id = request.GET.get("competitionID")
-    competition = get_object_or_404(Competition, pk=comp_id)
-    event = competition.current_event
+    return _vmix_feed(request, "current_event", _current_event_data)
+
 
+def _current_event_data(request):
+    competition = get_object_or_404(Competition, pk=request.GET.get("competitionID"))
+    event = competition.current_event
     if not event:
-        return Response([])
+        return []
+    return [_current_event_row(event, _lane_queues(competition, event))]
 
-    # Get first current lifter in the run order
-    current_ro = (
-        CompetitionRunOrder.objects
-        .filter(competition=competition, event=event, status="current")
-        .order_by("lane_number", "order")
-        .first()
-    )
 
-    if current_ro:
+@extend_schema(
+    summary="vMix: Broadcast state",
+    description="The current event, current and up-next competitors and leaderboard in one snapshot. "
+                "The leaderboard defaults to the current lifter's class.",
+    responses={200: dict},
+    methods=["GET"],
+    tags=["vMix"],
+)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def broadcast_state(request):
+    return _vmix_feed(request, "broadcast_state", _broadcast_state_data)
+
+
+def _broadcast_state_data(request):
+    # Read before the data, so the data is never older than its version
+    version = feed_version(request.GET.get("competitionID"))
+    competition, event = _feed_event(request)
+    queues = _lane_queues(competition, event) if event else {}
+
+    weight_ids = _leaderboard_ids(request.GET.get("weightClassID"))
+    division_ids = _leaderboard_ids(request.GET.get("divisionID"))
+    current_ro = next((queue["current"] for _, queue in sorted(queues.items()) if queue["current"]), None)
+    if not weight_ids and not division_ids and current_ro:
         ac = current_ro.athlete_competition
-        division_name = ac.division.name if ac.division else ""
-        weight_class_name = ac.weight_class.name if ac.weight_class else ""
-        gender = ac.athlete.gender if ac.athlete and ac.athlete.gender else ""
-        event_class = f"{division_name} - {weight_class_name}".strip(" -")
-    else:
-        event_class = ""
-        gender = ""
+        weight_ids = [ac.weight_class_id] if ac.weight_class_id else []
+        division_ids = [ac.division_id] if ac.division_id else []
+    try:
+        list_size = int(request.GET.get("listSize", 10))
+    except ValueError:
+        list_size = 10
 
-    return Response([{
-        "event_name": event.name,
-        "event_class": event_class,
-        "gender": gender
-    }])
+    return {
+        "version": version,
+        "competitionID": competition.pk,
+        "currentEvent": _current_event_row(event, queues) if event else None,
+        "currentCompetitors": _current_competitors(request, event, queues) if event else [],
+        "upNextCompetitors": _up_next_competitors(request, event, queues) if event else [],
+        "leaderboard": _leaderboard_rows(
+            competition.pk, weight_ids, division_ids, list_size
+        ) if weight_ids or division_ids else [],
+    }
+
+
+# Seconds between keep-alive comments on an idle stream
+BROADCAST_STREAM_KEEPALIVE = 15
+
+# Stream event names and the broadcast-state sections they carry
+BROADCAST_STREAM_SECTIONS = [
+    ("current_event", "currentEvent"),
+    ("current", "currentCompetitors"),
+    ("up_next", "upNextCompetitors"),
+    ("leaderboard", "leaderboard"),
+]
+
+
+async def broadcast_stream(request):
+    """
+    Server-sent events carrying the broadcast state, for vMix and OBS data
+    sources. Takes the same query parameters as broadcast-state.
+
+    Every section is sent on connect; after that the stream waits on the
+    competition's feed group and sends only the sections that changed with
+    each new feed version. The payloads come from the cached broadcast-state
+    feed, so all listeners share one build per version.
+    """
+    try:
+        competition_id = int(request.GET.get("competitionID"))
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("competitionID is required.")
+    if not await Competition.objects.filter(pk=competition_id).aexists():
+        return HttpResponseNotFound("Competition not found.")
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return HttpResponse("Live streaming is unavailable.", status=503)
+
+    response = StreamingHttpResponse(
+        _broadcast_events(request, competition_id, channel_layer),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _broadcast_events(request, competition_id, channel_layer):
+    group = feed_group_name(competition_id)
+    channel = await channel_layer.new_channel()
+    await channel_layer.group_add(group, channel)
+    sent = {}
+    try:
+        while True:
+            state, _ = await sync_to_async(get_feed)(
+                competition_id, "broadcast_state", _feed_params(request), lambda: _broadcast_state_data(request)
+            )
+            for event, section in BROADCAST_STREAM_SECTIONS:
+                payload = json.dumps(state[section], cls=JSONEncoder)
+                if sent.get(event) != payload:
+                    sent[event] = payload
+                    yield f"id: {state['version']}\nevent: {event}\ndata: {payload}\n\n"
+
+            # Wait for the next feed version
+            while True:
+                try:
+                    await asyncio.wait_for(channel_layer.receive(channel), BROADCAST_STREAM_KEEPALIVE)
+                    break
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+    finally:
+        await channel_layer.group_discard(group, channel)
 
 
 @api_view(["GET"])
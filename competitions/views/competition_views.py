@@ -19,6 +19,7 @@ from django.views.generic import TemplateView
 from accounts.models import OrganizerProfile
 from competitions.mixins import CompetitionAccessMixin, competition_permission_required
 from competitions.utils import get_onboarding_status
+from competitions.vmix import touch_feeds
 from competitions.views.utility_views import haversine_distance
 from competitions.models import Competition, AthleteCompetition, EventImplement, ZipCode, WeightClass, Event
 from competitions.forms import CompetitionForm, CompetitionFilter
@@ -357,6 +358,7 @@ def set_current_event(request, competition_pk, event_pk):
         return redirect('competitions:competition_run_order', competition_pk=competition.pk, event_pk=event.pk)
 
     competition.set_current_event(event)
+    touch_feeds([competition.pk])
 
     return redirect('competitions:competition_run_order', competition_pk=competition.pk, event_pk=event.pk)
 
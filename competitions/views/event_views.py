@@ -5,6 +5,7 @@ import logging
 from django.views import View
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.db.models import Max
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
@@ -18,7 +19,8 @@ from django.forms import modelformset_factory
 from competitions.models import Competition, AthleteCompetition, Result, Event, EventImplement, WeightClass, \
     Division, ImplementDefinition
 from competitions.forms import EventImplementForm, EventCreationForm, ImplementDefinitionForm
-from competitions.views.scoring_views import calculate_points_and_rankings
+from competitions.scoring import submit_scores
+from competitions.views.scoring_views import score_entries_from_post
 from competitions.mixins import competition_permission_required, CompetitionAccessMixin
 logger = logging.getLogger(__name__)
 
@@ -227,18 +229,36 @@ def event_list(request, competition_pk):
 @login_required
 def event_scores(request, competition_pk, eventorder_pk):
     competition = get_object_or_404(Competition, pk=competition_pk)
-    event = get_object_or_404(Event, pk=eventorder_pk)
-    athlete_competitions = AthleteCompetition.objects.filter(competition=competition)
+    event = get_object_or_404(Event, pk=eventorder_pk, competition=competition)
+
+    if request.method == 'POST':
+        logger.debug(f"POST data: {request.POST}")
+        try:
+            submit_scores(competition, score_entries_from_post(request.POST, skip_empty=True))
+        except ValidationError as e:
+            messages.error(request, " ".join(e.messages))
+            return redirect('competitions:event_scores', competition_pk=competition_pk, eventorder_pk=eventorder_pk)
+        messages.success(request, "Scores updated successfully!")
+        return redirect('competitions:event_scores', competition_pk=competition_pk, eventorder_pk=eventorder_pk)
+
+    athlete_competitions = AthleteCompetition.objects.filter(
+        competition=competition
+    ).select_related('athlete__user', 'division', 'weight_class')
+    results = {
+        result.athlete_competition_id: result
+        for result in Result.objects.filter(event=event, athlete_competition__competition=competition).order_by()
+    }
 
     grouped_athletes = defaultdict(lambda: defaultdict(list))
     for athlete_competition in athlete_competitions:
         gender = athlete_competition.athlete.gender
         division_name = athlete_competition.division.name if athlete_competition.division else "Unknown Division"
         weight_class = athlete_competition.weight_class
-        result, created = Result.objects.get_or_create(
+        # Athletes without a score yet get an unsaved placeholder; rows are only created on submit.
+        result = results.get(athlete_competition.pk) or Result(
             athlete_competition=athlete_competition,
             event=event,
-            defaults={'value': ''}  # Ensure a default value
+            value='',
         )
         grouped_athletes[gender][division_name].append({
             'athlete_competition': athlete_competition,
@@ -257,31 +277,6 @@ def event_scores(request, competition_pk, eventorder_pk):
         for gender, divisions in sorted(grouped_athletes.items())
     }
 
-    if request.method == 'POST':
-        logger.debug(f"POST data: {request.POST}")
-        for key, value in request.POST.items():
-            if key.startswith('result_'):
-                logger.debug(f"Processing key: {key}, value: {value}")
-                try:
-                    athlete_competition_id, event_id = map(int, key.replace('result_', '').split('_'))
-                    result = Result.objects.get(
-                        athlete_competition_id=athlete_competition_id,
-                        event_id=event_id
-                    )
-                    if value.strip():  # Only update if non-empty
-                        result.value = value.strip()
-                        result.save()
-                        logger.debug(f"Saved result: {result.value} for {result.athlete_competition.athlete.user.get_full_name()}")
-                    else:
-                        logger.warning(f"Empty value for {key}, not saved")
-                except (ValueError, Result.DoesNotExist) as e:
-                    logger.error(f"Error saving result for {key}: {e}")
-                    continue
-
-        calculate_points_and_rankings(competition.pk, event.pk)
-        messages.success(request, "Scores updated successfully!")
-        return redirect('competitions:event_scores', competition_pk=competition_pk, eventorder_pk=eventorder_pk)
-
     return render(request, 'competitions/event_score_update.html', {
         'competition': competition,
         'event': event,
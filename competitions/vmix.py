@@ -0,0 +1,111 @@
+"""
+Precomputed vMix data feeds.
+
+vMix polls the data-source endpoints about once a second per graphic layer.
+Each feed's payload is built once and cached per competition and query
+string, together with a strong ETag, under the competition's feed version.
+Run-order changes, scores and switching the current event move the
+competition to a new version, so an unchanged poll costs two cache reads and
+a client sending back the ETag it was given gets a 304 without a database
+query.
+
+Each new version is also announced to the competition's feed group on the
+channel layer, which the broadcast stream listens on instead of polling.
+Predicted times are reckoned from when the version began, so every payload
+of a version carries the same ETAs however late it is built.
+"""
+import hashlib
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.http import urlencode
+
+logger = logging.getLogger(__name__)
+
+# Payloads include athlete profiles, which can change without a new version;
+# the timeout bounds how long such edits take to show up.
+VMIX_FEED_TIMEOUT = 60
+
+# How long to remember when a version began; a version idle for longer
+# predicts from the time of the request.
+FEED_VERSION_TIME_TIMEOUT = 60 * 60 * 24
+
+
+def feed_version_cache_key(competition_id):
+    return f'competition:{competition_id}:vmix_version'
+
+
+def feed_version(competition_id):
+    return cache.get(feed_version_cache_key(competition_id), 0)
+
+
+def feed_version_time_cache_key(competition_id, version):
+    return f'competition:{competition_id}:vmix_version:{version}:began'
+
+
+def feed_time(competition_id):
+    """
+    When the competition's current feed version began, or now if that isn't
+    known.
+    """
+    version = feed_version(competition_id)
+    return cache.get(feed_version_time_cache_key(competition_id, version)) or timezone.now()
+
+
+def feed_group_name(competition_id):
+    return f'competition_{competition_id}_feed'
+
+
+def touch_feeds(competition_ids):
+    """
+    Moves the given competitions to a new feed version, retiring cached
+    payloads, and announces it to their feed groups.
+    """
+    for competition_id in competition_ids:
+        key = feed_version_cache_key(competition_id)
+        cache.add(key, 0, None)
+        version = cache.incr(key)
+        cache.set(feed_version_time_cache_key(competition_id, version), timezone.now(), FEED_VERSION_TIME_TIMEOUT)
+        notify_feed(competition_id, version)
+
+
+def notify_feed(competition_id, version):
+    """
+    Tells the competition's stream listeners about a new feed version. A
+    failed send is logged; listeners catch up on the next one.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            feed_group_name(competition_id),
+            {'type': 'feed.update', 'version': version},
+        )
+    except Exception:
+        logger.exception(f"Failed to announce feed version {version} of competition {competition_id}")
+
+
+def feed_cache_key(competition_id, feed, params, version):
+    query = hashlib.md5(urlencode(sorted(params.items())).encode()).hexdigest()
+    return f'competition:{competition_id}:vmix:{feed}:{version}:{query}'
+
+
+def get_feed(competition_id, feed, params, build):
+    """
+    Returns the (data, etag) of a feed for the given query parameters,
+    calling ``build`` and caching its result on a miss.
+    """
+    key = feed_cache_key(competition_id, feed, params, feed_version(competition_id))
+    payload = cache.get(key)
+    if payload is None:
+        data = build()
+        body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        payload = {'data': data, 'etag': f'"{hashlib.sha1(body.encode()).hexdigest()}"'}
+        cache.set(key, payload, VMIX_FEED_TIMEOUT)
+    return payload['data'], payload['etag']